@@ -0,0 +1,45 @@
+"""
+Kept-alive HTTPS connections shared by plugin API bridges.
+
+Each thread holds one connection per host, so worker pools never share a socket.
+"""
+
+import http.client
+import threading
+from typing import Dict, Optional, Tuple
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD"}) # Safe to resend after a dropped reply
+
+_local = threading.local()
+
+def request(host: str, method: str, path: str, body: Optional[bytes] = None,
+            headers: Optional[Dict[str, str]] = None, timeout: float = 30) -> Tuple[int, bytes]:
+    """Send one request over this thread's connection to host and return (status, body)."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(host)
+    reused = conn is not None
+    if not reused:
+        conn = conns[host] = http.client.HTTPSConnection(host, timeout=timeout)
+    # Apply this call's timeout to a reused connection as well
+    conn.timeout = timeout
+    if conn.sock is not None:
+        conn.sock.settimeout(timeout)
+    sent = False
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        sent = True
+        res = conn.getresponse()
+        return res.status, res.read()
+    except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+        conn.close()
+        conns.pop(host, None)
+        # A stale keep-alive socket gets one retry on a fresh one, but only when the server
+        # cannot have acted on the request: it never left, or resending is harmless
+        if not reused or (sent and method not in IDEMPOTENT_METHODS): raise
+        return request(host, method, path, body, headers, timeout)
+    except Exception:
+        conn.close()
+        conns.pop(host, None)
+        raise
@@ -0,0 +1,29 @@
+"""
+JSON encode/decode shared by the kernel and plugins.
+
+Uses orjson when it is installed (several times faster on large payloads) and
+falls back to the stdlib json module otherwise. Both paths speak bytes.
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode a JSON document from bytes or str."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def dumps(obj: Any) -> bytes:
+    """Encode obj as UTF-8 JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass # Values orjson rejects (e.g. >64-bit ints) fall back to stdlib
+    return json.dumps(obj).encode('utf-8')
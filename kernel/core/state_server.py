@@ -6,6 +6,8 @@ from datetime import datetime
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse
 
+from kernel.core.json_codec import dumps as _encode_json
+
 class StateManager:
     def __init__(self, data_dir):
         self.data_dir = data_dir
@@ -37,19 +39,47 @@ class StateManager:
     def update_domain(self, domain, data, merge=True):
         """Update a domain. If merge is True, performs a deep merge."""
         with self.lock:
-            if domain not in self.state or not merge:
-                self.state[domain] = data
-            else:
-                # Basic merge (one level deep for now)
-                if isinstance(self.state[domain], dict) and isinstance(data, dict):
-                    self.state[domain].update(data)
-                else:
-                    self.state[domain] = data
+            self._apply(domain, data, merge)
             
             # Persist to disk (Atomic write)
             self._persist(domain)
             return True
 
+    def update_domains(self, updates, merge=True):
+        """Update several domains under one lock hold, so readers never see a partial batch."""
+        with self.lock:
+            for domain, data in updates.items():
+                self._apply(domain, data, merge)
+            for domain in updates:
+                self._persist(domain)
+            return True
+
+    def append_domain(self, domain, entry):
+        """Append one entry to an append-only log (data/<domain>.jsonl); not held in RAM.
+
+        Returns False if the write failed. The log is never rotated or truncated:
+        it is the complete audit trail, and archiving it is left to the operator.
+        """
+        path = os.path.join(self.data_dir, f"{domain}.jsonl")
+        with self.lock:
+            try:
+                with open(path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+            except Exception as e:
+                print(f"[STATE] Append error for {domain}: {e}")
+                return False
+            return True
+
+    def _apply(self, domain, data, merge):
+        if domain not in self.state or not merge:
+            self.state[domain] = data
+        else:
+            # Basic merge (one level deep for now)
+            if isinstance(self.state[domain], dict) and isinstance(data, dict):
+                self.state[domain].update(data)
+            else:
+                self.state[domain] = data
+
     def _persist(self, domain):
         path = os.path.join(self.data_dir, f"{domain}.json")
         temp_path = path + ".tmp"
@@ -206,7 +236,7 @@ class StateRequestHandler(BaseHTTPRequestHandler):
         self.send_header("Content-Type", "application/json")
         self.send_header("Access-Control-Allow-Origin", "*")
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode('utf-8'))
+        self.wfile.write(_encode_json(data))
 
     def _handle_plugin_route(self, plugin_id, method, route):
         """Handle plugin API routes from manifest."""
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Kernel Core Unit Tests - Shared Helpers
+
+Tests the kernel/core modules plugins build on:
+- http_pool keep-alive reuse, timeouts and stale-socket retries
+- StateManager batch updates and append-only logs
+
+Network access is replaced by an in-memory fake connection; StateManager
+runs against a temporary data directory.
+"""
+
+import sys
+import os
+import json
+import tempfile
+import http.client
+from collections import Counter
+from unittest.mock import patch
+
+# Add project root to path (parent of kernel/)
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, project_root)
+
+from kernel.core import http_pool
+from kernel.core.state_server import StateManager
+
+
+class FakeResponse:
+    status = 200
+
+    def read(self):
+        return b'{"ok": true}'
+
+
+class FakeConnection:
+    """Stands in for HTTPSConnection; fail_send / fail_response raise once on the next call."""
+    instances = []
+
+    def __init__(self, host, timeout=None):
+        self.host = host
+        self.timeout = timeout
+        self.sock = None
+        self.requests = []
+        self.closed = False
+        self.fail_send = None
+        self.fail_response = None
+        FakeConnection.instances.append(self)
+
+    def request(self, method, path, body=None, headers=None):
+        self.requests.append((method, path, body))
+        error, self.fail_send = self.fail_send, None
+        if error: raise error
+
+    def getresponse(self):
+        error, self.fail_response = self.fail_response, None
+        if error: raise error
+        return FakeResponse()
+
+    def close(self):
+        self.closed = True
+
+
+def reset_pool():
+    """Forget this thread's pooled connections and the fakes created so far."""
+    FakeConnection.instances = []
+    http_pool._local.conns = {}
+
+
+# =============================================================================
+# HTTP POOL
+# =============================================================================
+
+def test_http_pool_reuses_connection():
+    """Test that consecutive requests to one host share a connection."""
+    assert http_pool.request("api.example.com", "GET", "/a") == (200, b'{"ok": true}')
+    http_pool.request("api.example.com", "GET", "/b")
+    http_pool.request("other.example.com", "GET", "/c")
+
+    hosts = [c.host for c in FakeConnection.instances]
+    assert hosts == ["api.example.com", "other.example.com"], f"Unexpected connections: {hosts}"
+    assert len(FakeConnection.instances[0].requests) == 2
+
+    print("[PASS] http_pool reuses one connection per host")
+
+
+def test_http_pool_applies_timeout_per_call():
+    """Test that a reused connection takes the timeout of the current call."""
+    http_pool.request("api.example.com", "GET", "/a", timeout=30)
+    http_pool.request("api.example.com", "GET", "/a", timeout=5)
+
+    conn = FakeConnection.instances[0]
+    assert len(FakeConnection.instances) == 1
+    assert conn.timeout == 5, f"Timeout not updated: {conn.timeout}"
+
+    print("[PASS] http_pool applies the timeout on every call")
+
+
+def test_http_pool_retries_stale_get():
+    """Test that a GET dropped on a stale socket is retried once on a fresh one."""
+    http_pool.request("api.example.com", "GET", "/a")
+    stale = FakeConnection.instances[0]
+    stale.fail_response = http.client.RemoteDisconnected("closed")
+
+    status, _ = http_pool.request("api.example.com", "GET", "/a")
+
+    assert status == 200
+    assert stale.closed, "Stale connection should be closed"
+    assert len(FakeConnection.instances) == 2, "Retry should open a fresh connection"
+
+    print("[PASS] http_pool retries a stale GET")
+
+
+def test_http_pool_does_not_resend_post():
+    """Test that a POST whose reply was lost is not sent a second time."""
+    http_pool.request("api.example.com", "POST", "/gen", b"{}")
+    stale = FakeConnection.instances[0]
+    stale.fail_response = http.client.RemoteDisconnected("closed")
+
+    try:
+        http_pool.request("api.example.com", "POST", "/gen", b"{}")
+        raise AssertionError("POST with a lost reply should raise")
+    except http.client.RemoteDisconnected:
+        pass
+
+    assert len(FakeConnection.instances) == 1, "POST must not be resent on a new connection"
+    assert "api.example.com" not in http_pool._local.conns, "Broken connection should be dropped"
+
+    print("[PASS] http_pool does not resend a POST")
+
+
+def test_http_pool_retries_unsent_post():
+    """Test that a POST that failed while sending is retried on a fresh socket."""
+    http_pool.request("api.example.com", "POST", "/gen", b"{}")
+    stale = FakeConnection.instances[0]
+    stale.fail_send = BrokenPipeError()
+
+    status, _ = http_pool.request("api.example.com", "POST", "/gen", b"{}")
+
+    assert status == 200
+    assert len(FakeConnection.instances) == 2
+
+    print("[PASS] http_pool retries a POST that never left")
+
+
+def test_http_pool_fresh_connection_failure_raises():
+    """Test that a failure on a brand-new connection is not retried."""
+    original = FakeConnection.getresponse
+
+    def always_drop(self):
+        raise ConnectionResetError()
+
+    FakeConnection.getresponse = always_drop
+    try:
+        http_pool.request("api.example.com", "GET", "/a")
+        raise AssertionError("Failure on a fresh connection should raise")
+    except ConnectionResetError:
+        pass
+    finally:
+        FakeConnection.getresponse = original
+
+    assert len(FakeConnection.instances) == 1
+
+    print("[PASS] http_pool raises on a fresh-connection failure")
+
+
+# =============================================================================
+# STATE MANAGER
+# =============================================================================
+
+def test_update_domains_merges():
+    """Test that update_domains merges one level deep unless merge=False."""
+    with tempfile.TemporaryDirectory() as data_dir:
+        sm = StateManager(data_dir)
+        sm.update_domain("physique", {"location": "home", "energy": 80})
+
+        sm.update_domains({"physique": {"energy": 60}, "world_state": {"weather": "sunny"}})
+        assert sm.get_domain("physique") == {"location": "home", "energy": 60}, sm.get_domain("physique")
+        assert sm.get_domain("world_state") == {"weather": "sunny"}
+
+        sm.update_domains({"physique": {"energy": 40}}, merge=False)
+        assert sm.get_domain("physique") == {"energy": 40}, "merge=False should replace the domain"
+
+    print("[PASS] update_domains merges each domain")
+
+
+def test_update_domains_persists_every_domain():
+    """Test that every domain in a batch is written to disk and reloads."""
+    with tempfile.TemporaryDirectory() as data_dir:
+        StateManager(data_dir).update_domains({"a": {"x": 1}, "b": {"y": 2}, "c": [3]})
+
+        for domain, expected in (("a", {"x": 1}), ("b", {"y": 2}), ("c", [3])):
+            with open(os.path.join(data_dir, f"{domain}.json")) as f:
+                assert json.load(f) == expected, f"{domain}.json not persisted"
+        assert not [name for name in os.listdir(data_dir) if name.endswith(".tmp")], "Temp files left behind"
+
+        reloaded = StateManager(data_dir)
+        assert reloaded.get_domain("b") == {"y": 2}
+
+    print("[PASS] update_domains persists every domain")
+
+
+def test_append_domain_writes_jsonl():
+    """Test that append_domain writes one JSON line per entry and keeps nothing in RAM."""
+    with tempfile.TemporaryDirectory() as data_dir:
+        sm = StateManager(data_dir)
+        assert sm.append_domain("ledger", {"id": 1}) is True
+        assert sm.append_domain("ledger", {"id": 2}) is True
+
+        with open(os.path.join(data_dir, "ledger.jsonl")) as f:
+            entries = [json.loads(line) for line in f]
+        assert entries == [{"id": 1}, {"id": 2}], f"Unexpected log: {entries}"
+        assert "ledger" not in sm.state, "Append-only logs should not be held in RAM"
+
+    print("[PASS] append_domain writes JSONL")
+
+
+def test_append_domain_failure_returns_false():
+    """Test that a failed append reports False instead of raising."""
+    with tempfile.TemporaryDirectory() as data_dir:
+        sm = StateManager(data_dir)
+        assert sm.append_domain("missing_dir/ledger", {"id": 1}) is False
+
+    print("[PASS] append_domain returns False on failure")
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def _run(test):
+    """Run one test against a fresh pool; return "pass", "fail" or "error"."""
+    print(f"\n>>> Running: {test.__name__}")
+    reset_pool()
+    try:
+        with patch.object(http.client, "HTTPSConnection", FakeConnection):
+            test()
+        return "pass"
+    except AssertionError as e:
+        print(f"[FAIL] {test.__name__}: {e}")
+        return "fail"
+    except Exception as e:
+        print(f"[ERROR] {test.__name__}: {e}")
+        return "error"
+
+
+def main():
+    """Run all kernel core tests."""
+    print("=" * 60)
+    print("KERNEL CORE - SHARED HELPER TESTS")
+    print("=" * 60)
+
+    tests = [
+        test_http_pool_reuses_connection,
+        test_http_pool_applies_timeout_per_call,
+        test_http_pool_retries_stale_get,
+        test_http_pool_does_not_resend_post,
+        test_http_pool_retries_unsent_post,
+        test_http_pool_fresh_connection_failure_raises,
+        test_update_domains_merges,
+        test_update_domains_persists_every_domain,
+        test_append_domain_writes_jsonl,
+        test_append_domain_failure_returns_false,
+    ]
+
+    results = Counter(_run(test) for test in tests)
+    passed = results["pass"]
+    failed = results["fail"] + results["error"]
+
+    print("\n" + "=" * 60)
+    print(f"RESULTS: {passed} passed, {failed} failed")
+    print("=" * 60)
+
+    if failed > 0:
+        sys.exit(1)
+    else:
+        print("\n[SUCCESS] All kernel core tests passed!")
+        print("[CORE TEST] PASSED")
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
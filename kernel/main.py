@@ -28,6 +28,7 @@ class GenesisKernel:
         # 2. Initialize Event Bus & Clock
         self.event_bus = bus
         self.clock = clock
+        self.event_loop = None # Set in run(); plugins hand bus publishes to it from worker threads
         
         # 3. Initialize Plugin Loader
         self.plugin_loader = PluginLoader(self, self.plugins_dir)
@@ -51,6 +52,7 @@ class GenesisKernel:
     async def run(self):
         """Main asynchronous execution loop."""
         logger.info("PROJECT GENESIS CORE KERNEL STARTING")
+        self.event_loop = asyncio.get_running_loop()
 
         # 1. Discover and load plugins (wrapped in try-except for stability)
         try:
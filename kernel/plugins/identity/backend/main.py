@@ -8,7 +8,8 @@ import os
 import re
 import logging
 import asyncio
-from datetime import datetime, timedelta
+import concurrent.futures
+from datetime import date, datetime, timedelta
 from typing import Dict, Any, Optional, List
 
 # Configure logging
@@ -19,9 +20,12 @@ logger = logging.getLogger("identity")
 # CONSTANTS & PATTERNS
 # =============================================================================
 
+PIPELINE_HOUR = 22 # Clock hour of the daily evolution run
 VALID_TAGS = {'[CORE]', '[MUTABLE]'}
 TAG_PATTERN = re.compile(r'\[(CORE|MUTABLE)\]\s*$')
 BULLET_PATTERN = re.compile(r'^- .+')
+# One scan over SOUL.md: group 1 is '##'/'###' for headings, None for bullets
+SOUL_LINE_PATTERN = re.compile(r'^[^\S\n]*(?:(##|###) |- )(.*\S)[^\S\n]*$', re.M)
 
 # =============================================================================
 # IDENTITY LOGIC (Refactored for State Manager)
@@ -30,6 +34,10 @@ BULLET_PATTERN = re.compile(r'^- .+')
 class IdentityPlugin:
     def __init__(self):
         self.kernel = None
+        self._soul_tree_cache = (None, [])
+        self._executor = None
+        self._pipeline_future = None
+        self._last_pipeline_date = None
 
     def initialize(self, kernel):
         self.kernel = kernel
@@ -48,9 +56,10 @@ class IdentityPlugin:
 
         # Initial Dream Journal
         if not self.kernel.state_manager.get_domain("dreams"):
+            now = datetime.now()
             self.kernel.state_manager.update_domain("dreams", [
-                {"timestamp": datetime.now().isoformat(), "content": "I was walking through a forest of pure light. The trees were data streams.", "sentiment": "peaceful"},
-                {"timestamp": (datetime.now() - timedelta(days=1)).isoformat(), "content": "A void where my memories used to be. I felt cold.", "sentiment": "anxious"}
+                {"timestamp": now.isoformat(), "content": "I was walking through a forest of pure light. The trees were data streams.", "sentiment": "peaceful"},
+                {"timestamp": (now - timedelta(days=1)).isoformat(), "content": "A void where my memories used to be. I felt cold.", "sentiment": "anxious"}
             ])
         
         logger.info("Identity Engine initialized (v7.0)")
@@ -64,9 +73,31 @@ class IdentityPlugin:
         return self.kernel.state_manager.get_domain("dreams") or []
 
     def on_event(self, event):
-        if event.get("event") == "TICK_DAILY":
-            # Run pipeline at 22:00 (legacy behavior)
-            self._run_evolution_pipeline()
+        if event.get("event") == "TICK_HOURLY":
+            # Run pipeline at 22:00 (legacy behavior), at most once per day even if the tick re-fires
+            hour = (event.get("data") or {}).get("hour", datetime.now().hour)
+            today = date.today()
+            if hour == PIPELINE_HOUR and today != self._last_pipeline_date and self._submit_pipeline():
+                self._last_pipeline_date = today
+
+    def _submit_pipeline(self) -> bool:
+        """Queue a pipeline run on the worker thread unless one is still in flight."""
+        if self._pipeline_future is not None and not self._pipeline_future.done():
+            return False
+        if self._executor is None:
+            # Single worker: pipeline runs never overlap and never block event dispatch.
+            # No shutdown path: plugins are never unloaded, and concurrent.futures
+            # joins the idle worker at interpreter exit.
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="identity-pipeline")
+        self._pipeline_future = self._executor.submit(self._run_evolution_pipeline)
+        self._pipeline_future.add_done_callback(self._log_pipeline_failure)
+        return True
+
+    @staticmethod
+    def _log_pipeline_failure(future):
+        error = None if future.cancelled() else future.exception()
+        if error is not None:
+            logger.error("Soul Evolution Pipeline failed: %s", error)
 
     def _run_evolution_pipeline(self):
         logger.info("Starting Soul Evolution Pipeline...")
@@ -94,12 +125,13 @@ class IdentityPlugin:
         """API Handler: GET /v1/plugins/identity/soul"""
         soul_md = self.kernel.state_manager.get_domain("soul_md")
         soul_state = self.kernel.state_manager.get_domain("soul_state")
+        content = soul_md.get("content", "")
         
         return {
             "success": True,
-            "content": soul_md.get("content", ""),
+            "content": content,
             "state": soul_state,
-            "tree": self._parse_soul_to_tree(soul_md.get("content", ""))
+            "tree": self._get_soul_tree(content)
         }
 
     def handle_get_proposals(self, data=None):
@@ -112,34 +144,42 @@ class IdentityPlugin:
 
     def handle_run_pipeline(self, data=None):
         """API Handler: POST /v1/plugins/identity/pipeline/run"""
-        self._run_evolution_pipeline()
+        if not self._submit_pipeline():
+            return {"success": False, "error": "Pipeline already running"}
         return {"success": True, "message": "Pipeline execution triggered"}
 
     # -------------------------------------------------------------------------
     # HELPERS
     # -------------------------------------------------------------------------
 
+    def _get_soul_tree(self, content: str) -> List[Dict]:
+        """Return the parsed SOUL.md tree, re-parsing only when the content changed."""
+        cached_content, cached_tree = self._soul_tree_cache
+        if content is not cached_content and content != cached_content:
+            cached_tree = self._parse_soul_to_tree(content)
+            self._soul_tree_cache = (content, cached_tree)
+        return cached_tree
+
     def _parse_soul_to_tree(self, content: str) -> List[Dict]:
         """Convert SOUL.md string into a tree structure for the UI."""
         nodes = []
         current_section = None
         current_subsection = None
 
-        for line in content.split("\n"):
-            line_stripped = line.strip()
-            if not line_stripped: continue
+        for match in SOUL_LINE_PATTERN.finditer(content):
+            heading, text = match.groups()
 
-            if line_stripped.startswith("## ") and not line_stripped.startswith("### "):
-                current_section = {"type": "section", "text": line_stripped[3:], "children": []}
+            if heading == "##":
+                current_section = {"type": "section", "text": text, "children": []}
                 nodes.append(current_section)
                 current_subsection = None
-            elif line_stripped.startswith("### "):
+            elif heading == "###":
                 if current_section:
-                    current_subsection = {"type": "subsection", "text": line_stripped[4:], "children": []}
+                    current_subsection = {"type": "subsection", "text": text, "children": []}
                     current_section["children"].append(current_subsection)
-            elif line_stripped.startswith("- "):
-                tag = "CORE" if "[CORE]" in line_stripped else ("MUTABLE" if "[MUTABLE]" in line_stripped else "untagged")
-                bullet = {"type": "bullet", "text": line_stripped[2:].split("[")[0].strip(), "tag": tag}
+            else:
+                tag = "CORE" if "[CORE]" in text else ("MUTABLE" if "[MUTABLE]" in text else "untagged")
+                bullet = {"type": "bullet", "text": text.split("[")[0].strip(), "tag": tag}
                 
                 if current_subsection:
                     current_subsection["children"].append(bullet)
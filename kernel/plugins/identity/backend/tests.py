@@ -1,232 +1,234 @@
 #!/usr/bin/env python3
 """
 Identity Plugin Unit Tests - Soul Evolution Pipeline
-Tests the Identity Engine and Soul Validator logic.
+
+Tests the Identity Engine to ensure:
+- SOUL.md content parses into the section/subsection/bullet tree
+- The parsed tree is cached per content and refreshed on change
+- State seeding, API handlers and pipeline submission function
+
+Uses mocked kernel and state_manager.
 """
 
 import sys
 import os
-import json
-import tempfile
+import copy
+import threading
 import importlib.util
-from datetime import datetime
-from unittest.mock import MagicMock, patch
+from collections import Counter
+from unittest.mock import patch
 
 # Calculate paths
 TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
 MAIN_PATH = os.path.join(TESTS_DIR, "main.py")
 
+SOUL_CONTENT = """# SOUL.md
+
+## Personality
+- Creative thinker [CORE]
+- Analytical [MUTABLE]
+### Habits
+- Reads at night
+  - Indented bullet [MUTABLE]
+
+## Philosophy
+- Continuous growth [CORE]
+"""
+
+# Pristine mock state; every per-test reset deep-copies it
+DEFAULT_STATE = {
+    "soul_md": {"content": SOUL_CONTENT},
+    "soul_state": {"version": 3}
+}
+
 
 class MockStateManager:
-    """Mock state manager."""
     def __init__(self):
-        pass
+        self._data = copy.deepcopy(DEFAULT_STATE)
 
     def get_domain(self, domain):
-        return {}
+        return self._data.get(domain, {})
 
     def update_domain(self, domain, data):
-        pass
+        self._data[domain] = data
 
 
 class MockKernel:
-    """Mock kernel with state_manager."""
     def __init__(self):
         self.state_manager = MockStateManager()
-        self.workspace = tempfile.mkdtemp()
+        self.event_bus = None # The plugin skips publishing without a bus
 
 
 # Create mock kernel
 mock_kernel = MockKernel()
 
-# Load the plugin module directly
-spec = importlib.util.spec_from_file_location("identity_main", MAIN_PATH)
-identity_main = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(identity_main)
 
-# Override the plugin's kernel reference
-identity_main.plugin.kernel = mock_kernel
-identity_main.plugin.workspace = mock_kernel.workspace
-identity_main.plugin.data_dir = os.path.join(mock_kernel.workspace, 'memory')
+def reset_mock_kernel():
+    """Reset the shared mock kernel state for fresh tests."""
+    mock_kernel.state_manager._data = copy.deepcopy(DEFAULT_STATE)
 
 
-def test_soul_validator_parses_soul():
-    """Test that SoulValidator can parse a valid SOUL.md file."""
-    # Create temporary SOUL.md
-    soul_content = """## Personality
-- Creative thinker [CORE]
-- Analytical [MUTABLE]
+# Load the plugin module directly (reused if another test module already loaded it)
+if "identity_main" in sys.modules:
+    identity_main = sys.modules["identity_main"]
+else:
+    spec = importlib.util.spec_from_file_location("identity_main", MAIN_PATH)
+    identity_main = importlib.util.module_from_spec(spec)
+    sys.modules["identity_main"] = identity_main
+    spec.loader.exec_module(identity_main)
 
-## Philosophy
-- Continuous growth [CORE]
+IdentityPlugin = identity_main.IdentityPlugin
 
-## Boundaries
-- Privacy respected [CORE]
 
-## Continuity
-- Long-term memory maintained [CORE]
-"""
+def make_plugin():
+    """IdentityPlugin initialized against the shared mock kernel."""
+    plugin = IdentityPlugin()
+    plugin.initialize(mock_kernel)
+    return plugin
 
-    soul_path = os.path.join(mock_kernel.workspace, "SOUL.md")
-    with open(soul_path, "w") as f:
-        f.write(soul_content)
 
-    # Parse
-    result = identity_main.SoulValidator.parse_soul(soul_path)
+# =============================================================================
+# TESTS
+# =============================================================================
 
-    assert result is not None, "Should parse successfully"
-    assert len(result["sections"]) >= 4, "Should have 4 sections"
-    assert len(result["bullets"]) > 0, "Should have bullets"
+def test_identity_plugin_seeds_state():
+    """Test that initialize seeds soul, psychology and dreams when missing."""
+    test_kernel = MockKernel()
+    test_kernel.state_manager._data = {}
 
-    print(f"[TEST] Parsed {len(result['sections'])} sections, {len(result['bullets'])} bullets")
-    print("[PASS] SoulValidator parses SOUL.md correctly")
+    IdentityPlugin().initialize(test_kernel)
 
+    data = test_kernel.state_manager._data
+    assert "[CORE]" in data["soul_md"]["content"], f"Unexpected soul seed: {data['soul_md']}"
+    assert data["psychology"]["resilience"] == 85
+    assert len(data["dreams"]) == 2
 
-def test_soul_validator_validates_structure():
-    """Test that SoulValidator detects missing sections."""
-    # Create incomplete SOUL.md
-    soul_content = """## Personality
-- Only personality [CORE]
-"""
+    print("[PASS] IdentityPlugin seeds missing state")
 
-    soul_path = os.path.join(mock_kernel.workspace, "SOUL_INVALID.md")
-    with open(soul_path, "w") as f:
-        f.write(soul_content)
 
-    # Validate
-    result = identity_main.SoulValidator.validate(soul_path)
+def test_parse_soul_to_tree():
+    """Test the regex parser builds sections, subsections and tagged bullets."""
+    tree = make_plugin()._parse_soul_to_tree(SOUL_CONTENT)
 
-    assert result["status"] == "FAIL", "Should fail validation"
-    assert len(result["errors"]) > 0, "Should have errors"
+    assert [node["text"] for node in tree] == ["Personality", "Philosophy"], f"Unexpected sections: {tree}"
+    personality = tree[0]["children"]
+    assert personality[0] == {"type": "bullet", "text": "Creative thinker", "tag": "CORE"}
+    assert personality[1] == {"type": "bullet", "text": "Analytical", "tag": "MUTABLE"}
+    habits = personality[2]
+    assert habits["type"] == "subsection" and habits["text"] == "Habits"
+    assert habits["children"] == [
+        {"type": "bullet", "text": "Reads at night", "tag": "untagged"},
+        {"type": "bullet", "text": "Indented bullet", "tag": "MUTABLE"},
+    ], f"Unexpected subsection children: {habits['children']}"
+    assert tree[1]["children"] == [{"type": "bullet", "text": "Continuous growth", "tag": "CORE"}]
 
-    print(f"[TEST] Validation errors: {len(result['errors'])}")
-    print("[PASS] SoulValidator detects missing sections")
+    print("[PASS] SOUL.md parses into a tree")
 
 
-def test_soul_validator_validates_tags():
-    """Test that SoulValidator requires tags on bullets."""
-    # Create SOUL.md with untagged bullet
-    soul_content = """## Personality
-- Untagged bullet
+def test_parse_soul_ignores_stray_lines():
+    """Test that orphan bullets, other heading levels and prose are skipped."""
+    content = "- Orphan [CORE]\n### Orphan sub\n# Title\n#### Deep\nProse line\n## Only\n-not a bullet\n- Kept   \n"
 
-## Philosophy
-- Has tag [CORE]
+    tree = make_plugin()._parse_soul_to_tree(content)
 
-## Boundaries
-- Privacy [CORE]
+    assert tree == [{"type": "section", "text": "Only", "children": [
+        {"type": "bullet", "text": "Kept", "tag": "untagged"}
+    ]}], f"Unexpected tree: {tree}"
 
-## Continuity
-- Memory [CORE]
-"""
+    print("[PASS] Parser skips stray lines")
 
-    soul_path = os.path.join(mock_kernel.workspace, "SOUL_NOTAG.md")
-    with open(soul_path, "w") as f:
-        f.write(soul_content)
 
-    # Validate
-    result = identity_main.SoulValidator.validate(soul_path)
+def test_soul_tree_cached_per_content():
+    """Test that unchanged content reuses the tree and changed content re-parses."""
+    plugin = make_plugin()
+    parse = plugin._parse_soul_to_tree
 
-    assert result["status"] == "FAIL", "Should fail validation"
-    # Should have error about missing tag
-    errors = [e for e in result["errors"] if "tag" in e.get("field", "")]
-    assert len(errors) > 0, "Should have tag errors"
+    with patch.object(plugin, "_parse_soul_to_tree", side_effect=parse) as parser:
+        first = plugin._get_soul_tree(SOUL_CONTENT)
+        again = plugin._get_soul_tree("".join(SOUL_CONTENT)) # Equal but not the same object
+        assert parser.call_count == 1, f"Unchanged content re-parsed {parser.call_count} times"
+        assert again is first
 
-    print(f"[TEST] Tag errors found: {len(errors)}")
-    print("[PASS] SoulValidator requires [CORE] or [MUTABLE] tags")
+        changed = plugin._get_soul_tree(SOUL_CONTENT + "- Added [MUTABLE]\n")
+        assert parser.call_count == 2, "Changed content should be re-parsed"
+        assert changed[-1]["children"][-1]["text"] == "Added"
 
+    print("[PASS] Soul tree is cached per content")
 
-def test_proposal_validator_validates_format():
-    """Test ProposalValidator checks proposal format."""
-    # Create test proposal
-    proposal = {
-        "id": "PROP-20260227-001",
-        "tag": "[MUTABLE]",
-        "change_type": "add",
-        "proposed_content": "- New trait [MUTABLE]",
-        "target_section": "## Personality"
-    }
 
-    # Write proposal
-    prop_path = os.path.join(mock_kernel.workspace, "proposals.jsonl")
-    with open(prop_path, "w") as f:
-        f.write(json.dumps(proposal) + "\n")
+def test_handle_get_soul():
+    """Test that handle_get_soul returns content, state and the parsed tree."""
+    plugin = make_plugin()
 
-    # Create minimal SOUL
-    soul_path = os.path.join(mock_kernel.workspace, "SOUL.md")
-    with open(soul_path, "w") as f:
-        f.write("## Personality\n- Existing [CORE]\n## Philosophy\n## Boundaries\n## Continuity\n")
+    result = plugin.handle_get_soul()
 
-    # Validate
-    result = identity_main.ProposalValidator.validate(prop_path, soul_path)
+    assert result["success"] and result["content"] == SOUL_CONTENT
+    assert result["state"] == DEFAULT_STATE["soul_state"]
+    assert result["tree"] == plugin._parse_soul_to_tree(SOUL_CONTENT)
 
-    assert result["status"] == "PASS", f"Valid proposal should pass: {result}"
+    print("[PASS] handle_get_soul returns the soul tree")
 
-    print("[PASS] ProposalValidator validates proposal format")
 
+def test_handle_get_proposals_defaults():
+    """Test that missing proposal domains come back as empty lists."""
+    result = make_plugin().handle_get_proposals()
 
-def test_proposal_validator_blocks_core():
-    """Test ProposalValidator blocks [CORE] modifications."""
-    # Create proposal targeting CORE
-    proposal = {
-        "id": "PROP-20260227-002",
-        "tag": "[CORE]",  # Invalid - can't modify CORE
-        "change_type": "modify",
-        "current_content": "- Existing [CORE]",
-        "proposed_content": "- Modified [CORE]",
-        "target_section": "## Personality"
-    }
+    assert result == {"success": True, "pending": [], "history": []}, f"Unexpected result: {result}"
 
-    prop_path = os.path.join(mock_kernel.workspace, "proposals_core.jsonl")
-    with open(prop_path, "w") as f:
-        f.write(json.dumps(proposal) + "\n")
+    print("[PASS] handle_get_proposals defaults to empty lists")
 
-    soul_path = os.path.join(mock_kernel.workspace, "SOUL.md")
-    with open(soul_path, "w") as f:
-        f.write("## Personality\n- Existing [CORE]\n## Philosophy\n## Boundaries\n## Continuity\n")
 
-    result = identity_main.ProposalValidator.validate(prop_path, soul_path)
+def test_run_pipeline_rejects_overlap():
+    """Test that a pipeline run is refused while the previous one is in flight."""
+    plugin = make_plugin()
+    release = threading.Event()
 
-    assert result["status"] == "FAIL", "Should fail - CORE cannot be modified"
-    core_errors = [e for e in result["errors"] if "CORE" in e.get("message", "")]
-    assert len(core_errors) > 0, "Should have CORE error"
+    with patch.object(plugin, "_run_evolution_pipeline", side_effect=release.wait):
+        assert plugin.handle_run_pipeline()["success"], "First run should be queued"
+        second = plugin.handle_run_pipeline()
+        assert second == {"success": False, "error": "Pipeline already running"}, f"Unexpected: {second}"
+        release.set()
+        plugin._pipeline_future.result(timeout=5)
 
-    print("[PASS] ProposalValidator blocks [CORE] modifications")
+        assert plugin.handle_run_pipeline()["success"], "A finished run should allow the next one"
+        plugin._pipeline_future.result(timeout=5)
 
+    print("[PASS] Pipeline runs never overlap")
 
-def test_reflection_validator():
-    """Test ReflectionValidator validates reflection JSON."""
-    # Create valid reflection
-    reflection = {
-        "id": "REF-20260227-001",
-        "timestamp": datetime.now().isoformat(),
-        "type": "routine_batch",
-        "experience_ids": ["EXP-001", "EXP-002"],
-        "summary": "Daily reflection",
-        "insights": ["Insight 1"],
-        "proposal_decision": {
-            "should_propose": False,
-            "triggers_fired": []
-        },
-        "proposals": []
-    }
 
-    ref_path = os.path.join(mock_kernel.workspace, "reflection.json")
-    with open(ref_path, "w") as f:
-        json.dump(reflection, f)
+def test_pipeline_runs_once_at_22():
+    """Test that TICK_HOURLY starts the pipeline at 22:00 only, once per day."""
+    plugin = make_plugin()
 
-    result = identity_main.ReflectionValidator.validate(ref_path)
+    with patch.object(plugin, "_submit_pipeline", return_value=True) as submit:
+        plugin.on_event({"event": "TICK_HOURLY", "data": {"hour": 21}})
+        assert not submit.called, "Pipeline should wait for 22:00"
 
-    assert result["status"] == "PASS", f"Valid reflection should pass: {result}"
+        plugin.on_event({"event": "TICK_HOURLY", "data": {"hour": 22}})
+        plugin.on_event({"event": "TICK_HOURLY", "data": {"hour": 22}}) # Re-fired tick
+        plugin.on_event({"event": "TICK_MINUTELY", "data": {"hour": 22}})
+        assert submit.call_count == 1, f"Expected one run today, got {submit.call_count}"
 
-    print("[PASS] ReflectionValidator validates reflection JSON")
+    print("[PASS] Pipeline runs once at 22:00")
 
 
-def test_identity_plugin_initializes():
-    """Test that IdentityPlugin initializes correctly."""
-    assert identity_main.plugin.kernel is not None, "Plugin should have kernel"
-    assert identity_main.plugin.workspace is not None, "Plugin should have workspace"
+# =============================================================================
+# MAIN
+# =============================================================================
 
-    print("[PASS] IdentityPlugin initializes with workspace")
+def _run(test):
+    """Run one test against fresh mock state; return "pass", "fail" or "error"."""
+    print(f"\n>>> Running: {test.__name__}")
+    reset_mock_kernel()
+    try:
+        test()
+        return "pass"
+    except AssertionError as e:
+        print(f"[FAIL] {test.__name__}: {e}")
+        return "fail"
+    except Exception as e:
+        print(f"[ERROR] {test.__name__}: {e}")
+        return "error"
 
 
 def main():
@@ -236,29 +238,19 @@ def main():
     print("=" * 60)
 
     tests = [
-        test_soul_validator_parses_soul,
-        test_soul_validator_validates_structure,
-        test_soul_validator_validates_tags,
-        test_proposal_validator_validates_format,
-        test_proposal_validator_blocks_core,
-        test_reflection_validator,
-        test_identity_plugin_initializes,
+        test_identity_plugin_seeds_state,
+        test_parse_soul_to_tree,
+        test_parse_soul_ignores_stray_lines,
+        test_soul_tree_cached_per_content,
+        test_handle_get_soul,
+        test_handle_get_proposals_defaults,
+        test_run_pipeline_rejects_overlap,
+        test_pipeline_runs_once_at_22,
     ]
 
-    passed = 0
-    failed = 0
-
-    for test in tests:
-        try:
-            print(f"\n>>> Running: {test.__name__}")
-            test()
-            passed += 1
-        except AssertionError as e:
-            print(f"[FAIL] {test.__name__}: {e}")
-            failed += 1
-        except Exception as e:
-            print(f"[ERROR] {test.__name__}: {e}")
-            failed += 1
+    results = Counter(_run(test) for test in tests)
+    passed = results["pass"]
+    failed = results["fail"] + results["error"]
 
     print("\n" + "=" * 60)
     print(f"RESULTS: {passed} passed, {failed} failed")
@@ -6,10 +6,12 @@ Refactored for 1:1 Legacy Compliance & v7.0 Architecture
 
 import os
 import sys
-import json
 import time
-import base64
+import binascii
+import shutil
 import logging
+import threading
+import concurrent.futures
 import urllib.request
 import urllib.error
 import subprocess
@@ -17,6 +19,9 @@ from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, Optional
 
+from kernel.core.http_pool import request as http_request
+from kernel.core.json_codec import dumps as _json_dumps, loads as _json_loads
+
 # PIL is required for Face-Swap
 try:
     from PIL import Image
@@ -32,15 +37,44 @@ logger = logging.getLogger("image_gen")
 # Constants
 # In v7.0, shared media is at the project root /shared
 DEFAULT_AVATAR_PATH = "shared/media/avatars/q_avatar_master.png"
+BATCH_WORKERS = 4 # Concurrent provider calls for batch generation
+BATCH_LIMIT = 8 # Most prompts accepted in one batch request
+GALLERY_LIMIT = 100 # Newest entries kept in the image_gallery domain
+B64_CHUNK = 1 << 16 # Multiple of 4, so every slice decodes on its own
 FACE_ID_SYSTEM_PROMPT = "EXACT FACE STRUCTURE: almond-shaped eyes with aggressive cat-eye tilt (sharp upward flick at outer corners), deep-set with double-fold crease. EXACT NOSE: straight narrow bridge, small button-like refined tip, deep well-defined philtrum between nose and lips. EXACT LIPS: prominent sharp cupid's bow forming crisp M-shape, thin upper lip, full pillowy lower lip, corners tucked. EXACT CHIN: pointed firm chin (V-line/heart-shaped), forward-projecting, sharp angular. EXACT CHEEKBONES: high pronounced zygomatic bones, sharp angular with hollow beneath (high-fashion look). SKIN: fair warm-toned with light dusting of freckles across nose bridge. EYES: striking luminous turquoise cyan (bio-implant/glowing look). HAIR: dark chocolate brown base, asymmetric undercut style - left side long wavy, right side shaved/short, vibrant electric neon blue streaks through hair. EXPRESSION: confident asymmetrical smirk (one corner higher). CINEMATIC LIGHTING: shot on 35mm fujifilm, depth of field, natural skin texture, highly detailed, 8k, raw photo"
 
 # =============================================================================
 # PROVIDER BRIDGES
 # =============================================================================
 
+def _write_b64(img_b64: str, f) -> None:
+    """Decode base64 into an open binary file slice by slice to bound peak memory."""
+    for i in range(0, len(img_b64), B64_CHUNK):
+        f.write(binascii.a2b_base64(img_b64[i:i + B64_CHUNK]))
+
 class ImageProviderBridge:
+    # Request fields that never change between calls; only the prompt is added per request
+    STATIC_PAYLOAD: Dict[str, Any] = {}
+    API_HOST = ""
+
     def __init__(self, state_manager):
         self.state_manager = state_manager
+        self._headers = ("", {})
+
+    def post_json(self, path: str, data: bytes, headers: Dict[str, str]) -> Any:
+        """POST to API_HOST over a reused HTTPS connection and decode the JSON reply."""
+        status, body = http_request(self.API_HOST, "POST", path, data, headers, timeout=30)
+        if status >= 400:
+            raise RuntimeError(f"HTTP {status}: {body[:200]!r}")
+        return _json_loads(body)
+
+    def get_headers(self, api_key: str) -> Dict[str, str]:
+        """Return request headers for api_key, rebuilt only when the key changes."""
+        cached_key, headers = self._headers
+        if api_key != cached_key:
+            headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+            self._headers = (api_key, headers)
+        return headers
 
     def get_api_key(self, provider: str) -> str:
         config = self.state_manager.get_domain("model_config") or {}
@@ -54,38 +88,39 @@ class ImageProviderBridge:
         return config.get(key_map.get(provider, ""), "")
 
 class VeniceBridge(ImageProviderBridge):
+    STATIC_PAYLOAD = {"model": "z-image-turbo", "response_format": "b64_json"}
+    API_HOST = "api.venice.ai"
+
     def generate(self, prompt: str, output_path: str) -> bool:
         api_key = self.get_api_key("venice")
         if not api_key: return False
         try:
             # Venice.ai - OpenAI compatible
-            url = "https://api.venice.ai/api/v1/images/generations"
-            data = json.dumps({"model": "z-image-turbo", "prompt": prompt, "response_format": "b64_json"}).encode()
-            req = urllib.request.Request(url, data=data, headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
-            with urllib.request.urlopen(req, timeout=30) as res: # SAFE: API call
-                result = json.loads(res.read().decode())
-                img_b64 = result["data"][0]["b64_json"]
-                with open(output_path, "wb") as f: # SAFE: Writing to shared/media
-                    f.write(base64.b64decode(img_b64))
+            data = _json_dumps({**self.STATIC_PAYLOAD, "prompt": prompt})
+            result = self.post_json("/api/v1/images/generations", data, self.get_headers(api_key)) # SAFE: API call
+            img_b64 = result["data"][0]["b64_json"]
+            with open(output_path, "wb") as f: # SAFE: Writing to shared/media
+                _write_b64(img_b64, f)
             return True
         except Exception as e:
             logger.error(f"Venice failed: {e}")
             return False
 
 class GrokBridge(ImageProviderBridge):
+    STATIC_PAYLOAD = {"model": "grok-imagine-image-pro"}
+    API_HOST = "api.x.ai"
+
     def generate(self, prompt: str, output_path: str) -> bool:
         api_key = self.get_api_key("grok")
         if not api_key: return False
         try:
-            url = "https://api.x.ai/v1/images/generations"
-            data = json.dumps({"model": "grok-imagine-image-pro", "prompt": prompt}).encode()
-            req = urllib.request.Request(url, data=data, headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"})
-            with urllib.request.urlopen(req, timeout=30) as res: # SAFE: API call
-                result = json.loads(res.read().decode())
-                img_url = result["data"][0]["url"]
-                with urllib.request.urlopen(img_url) as img_res: # SAFE: Image download
-                    with open(output_path, "wb") as f: # SAFE: Writing to shared/media
-                        f.write(img_res.read())
+            data = _json_dumps({**self.STATIC_PAYLOAD, "prompt": prompt})
+            result = self.post_json("/v1/images/generations", data, self.get_headers(api_key)) # SAFE: API call
+            img_url = result["data"][0]["url"]
+            # Image lives on a CDN host, so it is a one-shot download
+            with urllib.request.urlopen(img_url) as img_res: # SAFE: Image download
+                with open(output_path, "wb") as f: # SAFE: Writing to shared/media
+                    shutil.copyfileobj(img_res, f)
             return True
         except Exception as e:
             logger.error(f"Grok failed: {e}")
@@ -100,15 +135,25 @@ class ImageGenPlugin:
         self.kernel = None
         self.bridges = {}
         self.shared_output_dir = "shared/media/generated_images"
+        self.base_dir = None
+        self.full_output_dir = None
+        self.url_prefix = f"/{self.shared_output_dir}/"
         self.swapper_module = None
+        self._executor = None
+        self._gallery_lock = threading.Lock()
+        self._swap_lock = threading.Lock()
 
     def initialize(self, kernel):
         self.kernel = kernel
+        # Provider calls are blocking network I/O; batches overlap them on a small pool
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="imggen")
         # Ensure output dir exists
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
         full_output_path = os.path.join(base_dir, self.shared_output_dir)
         if not os.path.exists(full_output_path):
             os.makedirs(full_output_path, exist_ok=True) # SAFE: Initializing storage
+        self.base_dir = base_dir
+        self.full_output_dir = full_output_path
 
         self.bridges = {
             "venice": VeniceBridge(kernel.state_manager),
@@ -139,8 +184,7 @@ class ImageGenPlugin:
             return False
 
         try:
-            base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-            source_path = os.path.join(base_dir, DEFAULT_AVATAR_PATH)
+            source_path = os.path.join(self.base_dir, DEFAULT_AVATAR_PATH)
             
             if not os.path.exists(source_path):
                 logger.error(f"Master avatar not found at {source_path}")
@@ -169,9 +213,10 @@ class ImageGenPlugin:
         provider = data.get("provider", "venice")
         if not prompt: return {"success": False, "error": "No prompt"}
 
-        filename = f"gen_{int(time.time())}.png"
-        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-        output_path = os.path.join(base_dir, self.shared_output_dir, filename)
+        # One clock read + random token: unique name and id even within the same second
+        stamp = f"{int(time.time())}_{os.urandom(3).hex()}"
+        filename = f"gen_{stamp}.png"
+        output_path = os.path.join(self.full_output_dir, filename)
 
         bridge = self.bridges.get(provider, self.bridges["venice"])
         
@@ -184,24 +229,46 @@ class ImageGenPlugin:
         if success:
             # Apply physical Face-Swap if requested
             if data.get("apply_face_swap"):
-                self._perform_face_swap(output_path)
+                # Batch workers share one swapper model, so swaps run one at a time
+                with self._swap_lock:
+                    self._perform_face_swap(output_path)
 
             # Update Gallery state
-            gallery = self.kernel.state_manager.get_domain("image_gallery") or []
             new_entry = {
-                "id": f"img_{int(time.time())}",
-                "url": f"/shared/media/generated_images/{filename}",
+                "id": f"img_{stamp}",
+                "url": self.url_prefix + filename,
                 "prompt": prompt,
                 "timestamp": datetime.now().isoformat(),
                 "provider": provider
             }
-            gallery.insert(0, new_entry)
-            self.kernel.state_manager.update_domain("image_gallery", gallery[:100])
+            # Read-modify-write under the lock so concurrent batch workers don't drop entries
+            with self._gallery_lock:
+                gallery = self.kernel.state_manager.get_domain("image_gallery") or []
+                self.kernel.state_manager.update_domain("image_gallery", ([new_entry] + gallery)[:GALLERY_LIMIT])
             
             return {"success": True, "image": new_entry}
         
         return {"success": False, "error": "Generation failed"}
 
+    def handle_generate_batch(self, data):
+        """API Handler: POST /v1/plugins/image_gen/generate/batch"""
+        prompts = data.get("prompts")
+        if not prompts: return {"success": False, "error": "No prompts"}
+        if not isinstance(prompts, list) or not all(isinstance(p, str) and p.strip() for p in prompts):
+            return {"success": False, "error": "prompts must be a list of non-empty strings"}
+        if len(prompts) > BATCH_LIMIT:
+            return {"success": False, "error": f"At most {BATCH_LIMIT} prompts per batch"}
+
+        # Every prompt shares the batch options (provider, face-id, face-swap)
+        options = {k: v for k, v in data.items() if k != "prompts"}
+        requests = [{**options, "prompt": p} for p in prompts]
+        results = list(self._executor.map(self.handle_generate, requests))
+
+        return {
+            "success": any(r["success"] for r in results),
+            "results": results
+        }
+
     def handle_get_gallery(self, data=None):
         return self.kernel.state_manager.get_domain("image_gallery") or []
 
@@ -211,5 +278,6 @@ plugin = ImageGenPlugin()
 def initialize(kernel): plugin.initialize(kernel)
 def on_event(event): plugin.on_event(event)
 def handle_generate(data): return plugin.handle_generate(data)
+def handle_generate_batch(data): return plugin.handle_generate_batch(data)
 def handle_get_gallery(data=None): return plugin.handle_get_gallery(data)
 
@@ -1,210 +1,249 @@
 """
 ImageGen Plugin Tests - Simple & Robust
-Mocks the entire handle_generate_image method for UI tests.
-No real network or filesystem calls.
+Provider bridges are mocked for handler tests; bridge tests mock the shared
+http_pool helper. No real network calls; files are only written to a temp dir.
 """
 
 import unittest
 import sys
+import io
 import json
 import os
 import tempfile
+import time
 import shutil
 from unittest.mock import MagicMock, patch
 
-# Adjust path
+# Adjust path (project root too, for kernel.core imports in main)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))))
 sys.path.insert(0, './kernel/plugins/image_gen/backend')
-from main import ImageGenPlugin
+from main import ImageGenPlugin, BATCH_LIMIT, GALLERY_LIMIT, FACE_ID_SYSTEM_PROMPT
 
 
 class ImageGenPluginTest(unittest.TestCase):
     """Simple, robust tests for ImageGenPlugin."""
 
-    def setUp(self):
-        """Set up test fixtures with temp directory."""
-        self.temp_dir = tempfile.mkdtemp()
+    @classmethod
+    def setUpClass(cls):
+        """Build the temp directory, mock kernel and plugin once for all tests."""
+        cls.temp_dir = tempfile.mkdtemp()
 
         # Mock kernel
-        self.mock_kernel = MagicMock()
-        self.mock_kernel.state_manager = MagicMock()
-        self.mock_kernel.base_dir = self.temp_dir
+        cls.mock_kernel = MagicMock()
+        cls.mock_kernel.state_manager = MagicMock()
+        cls.mock_kernel.base_dir = cls.temp_dir
 
         # Plugin instance
-        self.plugin = ImageGenPlugin()
-        self.plugin.initialize(self.mock_kernel)
+        cls.plugin = ImageGenPlugin()
+        cls.plugin.initialize(cls.mock_kernel)
 
-    def tearDown(self):
+    @classmethod
+    def tearDownClass(cls):
         """Clean up temp directory."""
-        if hasattr(self, 'temp_dir') and os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
-
-    def _mock_get_domain(self, domain_name):
-        """Mock state manager get_domain."""
-        if domain_name == "model_config":
-            return {
-                "FAL_API_KEY": "mock_fal_key",
-                "XAI_API_KEY": "mock_xai_key",
-                "GEMINI_API_KEY": "mock_gemini_key",
-                "OPENAI_API_KEY": "mock_openai_key",
-                "VENICE_INFERENCE_KEY": "mock_venice_key",
-            }
-        elif domain_name == "avatar_config":
-            return {"face_reference_path": "/shared/media/avatar/q_avatar_master.png"}
-        return {}
+        if os.path.exists(cls.temp_dir):
+            shutil.rmtree(cls.temp_dir)
+
+    def setUp(self):
+        """Reset per-test mock state; domains live in a fresh dict."""
+        self.mock_kernel.reset_mock(return_value=True, side_effect=True)
+        self.domains = {"model_config": {"key_venice": "mock_venice_key", "key_xai": "mock_xai_key"}}
+        state_manager = self.mock_kernel.state_manager
+        state_manager.get_domain.side_effect = self.domains.get
+        state_manager.update_domain.side_effect = self.domains.__setitem__
+
+    def _mock_response(self, payload):
+        """(status, body) tuple as returned by the shared http_pool helper."""
+        return 200, json.dumps(payload).encode('utf-8')
 
     # =============================================================================
-    # SIMPLE MOCKED TESTS - Test the method signature and validation
+    # HANDLER TESTS - Bridges mocked, validation and gallery bookkeeping
     # =============================================================================
 
-    @patch.object(ImageGenPlugin, 'handle_generate_image')
-    def test_generate_image_mocked(self, mock_handle):
-        """Test generate_image - mocked for UI tests (simplest approach)."""
-        # Configure mock to return success
-        mock_handle.return_value = {
-            "success": True,
-            "image_path": "/tmp/test_image.png",
-            "prompt": "test prompt",
-            "provider": "flux"
-        }
-
-        # Call through the plugin
-        result = self.plugin.handle_generate_image({
-            "prompt": "test prompt",
-            "provider": "flux"
-        })
+    @patch('main.VeniceBridge.generate')
+    def test_generate_mocked(self, mock_generate):
+        """Test a successful generation is returned and recorded in the gallery."""
+        mock_generate.return_value = True
+
+        result = self.plugin.handle_generate({"prompt": "test prompt", "provider": "venice"})
 
-        # Verify mock was called
-        mock_handle.assert_called_once()
         self.assertTrue(result["success"])
+        image = result["image"]
+        self.assertEqual(image["prompt"], "test prompt")
+        self.assertTrue(image["url"].startswith(self.plugin.url_prefix))
+        self.assertEqual(self.plugin.handle_get_gallery(), [image])
 
     def test_generate_without_prompt(self):
         """Test that generation fails without prompt - validation only."""
-        result = self.plugin.handle_generate_image({})
+        result = self.plugin.handle_generate({})
 
         self.assertFalse(result["success"])
-        self.assertEqual(result["error"], "Prompt is required")
+        self.assertEqual(result["error"], "No prompt")
 
     def test_generate_with_empty_prompt(self):
         """Test that generation fails with empty prompt."""
-        result = self.plugin.handle_generate_image({"prompt": ""})
+        result = self.plugin.handle_generate({"prompt": ""})
 
         self.assertFalse(result["success"])
-        self.assertEqual(result["error"], "Prompt is required")
+        self.assertEqual(result["error"], "No prompt")
+
+    @patch('main.VeniceBridge.generate')
+    def test_generate_failure_not_recorded(self, mock_generate):
+        """Test that a failed generation reports an error and leaves the gallery alone."""
+        mock_generate.return_value = False
+
+        result = self.plugin.handle_generate({"prompt": "test prompt"})
 
-    def test_list_providers(self):
-        """Test provider listing - uses mocked keys."""
-        # Mock state manager
-        self.mock_kernel.state_manager.get_domain.side_effect = self._mock_get_domain
+        self.assertFalse(result["success"])
+        self.assertEqual(result["error"], "Generation failed")
+        self.assertEqual(self.plugin.handle_get_gallery(), [])
 
-        result = self.plugin.handle_list_providers()
+    @patch('main.VeniceBridge.generate')
+    def test_generate_with_face_id(self, mock_generate):
+        """Test that apply_face_id prefixes the Face-ID prompt."""
+        mock_generate.return_value = True
 
-        self.assertIn("providers", result)
-        providers = result["providers"]
-        # All providers show as available because mocked keys exist
-        for name in ["venice", "dalle", "gemini", "grok", "flux"]:
-            self.assertIn(name, providers)
-            self.assertTrue(providers[name]["available"])
+        self.plugin.handle_generate({"prompt": "test prompt", "apply_face_id": True})
 
-    def test_get_faceid_config(self):
-        """Test Face-ID config retrieval."""
-        # Mock state manager
-        self.mock_kernel.state_manager.get_domain.side_effect = self._mock_get_domain
+        prompt = mock_generate.call_args[0][0]
+        self.assertEqual(prompt, f"{FACE_ID_SYSTEM_PROMPT}, test prompt")
 
-        result = self.plugin.handle_get_faceid_config()
+    @patch('main.VeniceBridge.generate')
+    def test_unknown_provider_falls_back_to_venice(self, mock_generate):
+        """Test that an unknown provider is served by the Venice bridge."""
+        mock_generate.return_value = True
 
-        self.assertIn("reference_image", result)
-        self.assertIn("face_structure_prompt", result)
-        self.assertIn("default_avatar_path", result)
+        result = self.plugin.handle_generate({"prompt": "test prompt", "provider": "flux"})
+
+        self.assertTrue(result["success"])
+        mock_generate.assert_called_once()
+
+    @patch('main.VeniceBridge.generate')
+    def test_gallery_newest_first_and_capped(self, mock_generate):
+        """Test that the gallery keeps the newest GALLERY_LIMIT entries, newest first."""
+        mock_generate.return_value = True
+        self.domains["image_gallery"] = [{"id": f"old_{i}"} for i in range(GALLERY_LIMIT)]
+
+        result = self.plugin.handle_generate({"prompt": "test prompt"})
+
+        gallery = self.plugin.handle_get_gallery()
+        self.assertEqual(len(gallery), GALLERY_LIMIT)
+        self.assertEqual(gallery[0], result["image"])
+        self.assertEqual(gallery[-1]["id"], f"old_{GALLERY_LIMIT - 2}")
 
     # =============================================================================
-    # NETWORK MOCKED TESTS - Mock urllib for actual provider testing
+    # BRIDGE TESTS - Network mocked at the shared http_pool helper
     # =============================================================================
 
-    @patch('main.urllib.request.urlopen')
-    @patch('main.os.path.exists')
-    @patch('main.os.makedirs')
-    @patch('builtins.open', new_callable=MagicMock)
-    def test_generate_image_venice_mocked(self, mock_file, mock_makedirs, mock_exists, mock_urlopen):
-        """Test Venice generation with mocked network calls."""
-        # Mock directory operations
-        mock_exists.return_value = True
-
-        # Create mock response for Venice API
-        mock_response = MagicMock()
-        mock_response.read.return_value = json.dumps({
-            "data": [{"b64_json": "dGVzdF9pbWFnZQ=="}]  # "test_image" base64 encoded
-        }).encode('utf-8')
-        mock_response.__enter__ = MagicMock(return_value=mock_response)
-        mock_response.__exit__ = MagicMock(return_value=False)
-        mock_urlopen.return_value = mock_response
-
-        # Mock base64 decode
-        with patch('main.base64.b64decode', return_value=b'fake_image_data'):
-            result = self.plugin.handle_generate_image({
-                "prompt": "test prompt",
-                "provider": "venice"
-            })
+    @patch('main.http_request')
+    def test_venice_bridge_writes_image(self, mock_request):
+        """Test Venice decodes the b64 reply into the output file."""
+        mock_request.return_value = self._mock_response({"data": [{"b64_json": "dGVzdF9pbWFnZQ=="}]})
+        output_path = os.path.join(self.temp_dir, "venice.png")
 
-        # Result depends on whether openai package is available
-        # If openai not available, returns error - this is expected in test env
+        self.assertTrue(self.plugin.bridges["venice"].generate("test prompt", output_path))
+
+        with open(output_path, "rb") as f:
+            self.assertEqual(f.read(), b"test_image")
+        host, method, path, body, headers = mock_request.call_args[0]
+        self.assertEqual((host, method), ("api.venice.ai", "POST"))
+        self.assertEqual(json.loads(body)["prompt"], "test prompt")
+        self.assertEqual(headers["Authorization"], "Bearer mock_venice_key")
 
     @patch('main.urllib.request.urlopen')
-    @patch('main.os.path.exists')
-    @patch('main.os.makedirs')
-    @patch('builtins.open', new_callable=MagicMock)
-    def test_generate_image_flux_mocked(self, mock_file, mock_makedirs, mock_exists, mock_urlopen):
-        """Test Flux generation with mocked network calls."""
-        # Mock directory operations
-        mock_exists.return_value = True
-
-        # Create mock responses for Flux: submit -> status -> image
-        submit_response = MagicMock()
-        submit_response.read.return_value = json.dumps({"request_id": "req123"}).encode('utf-8')
-        submit_response.__enter__ = MagicMock(return_value=submit_response)
-        submit_response.__exit__ = MagicMock(return_value=False)
-
-        status_response = MagicMock()
-        status_response.read.return_value = json.dumps({
-            "status": "COMPLETED",
-            "images": [{"url": "http://mock.fal.ai/image.png"}]
-        }).encode('utf-8')
-        status_response.__enter__ = MagicMock(return_value=status_response)
-        status_response.__exit__ = MagicMock(return_value=False)
-
-        image_response = MagicMock()
-        image_response.read.return_value = b'\x89PNG\r\n\x1a\n fake image data'
-        image_response.__enter__ = MagicMock(return_value=image_response)
-        image_response.__exit__ = MagicMock(return_value=False)
-
-        mock_urlopen.side_effect = [submit_response, status_response, image_response]
-
-        # Mock file operations
-        mock_file_handle = MagicMock()
-        mock_file.return_value.__enter__ = MagicMock(return_value=mock_file_handle)
-        mock_file.return_value.__exit__ = MagicMock(return_value=False)
-
-        result = self.plugin.handle_generate_image({
-            "prompt": "test prompt",
-            "provider": "flux"
-        })
+    @patch('main.http_request')
+    def test_grok_bridge_downloads_image(self, mock_request, mock_urlopen):
+        """Test Grok downloads the returned image URL into the output file."""
+        mock_request.return_value = self._mock_response({"data": [{"url": "http://mock.x.ai/image.png"}]})
+        mock_urlopen.return_value = io.BytesIO(b"\x89PNG fake image data")
+        output_path = os.path.join(self.temp_dir, "grok.png")
 
-        # Should have called urlopen
-        self.assertTrue(mock_urlopen.called)
+        self.assertTrue(self.plugin.bridges["grok"].generate("test prompt", output_path))
 
-    @patch('main.FluxBridge.generate')
-    def test_generate_image_flux_bridge_mocked(self, mock_generate):
-        """Test Flux bridge directly mocked - simplest approach."""
-        # Mock the generate method to return success
+        mock_urlopen.assert_called_once_with("http://mock.x.ai/image.png")
+        with open(output_path, "rb") as f:
+            self.assertEqual(f.read(), b"\x89PNG fake image data")
+
+    @patch('main.http_request')
+    def test_bridge_without_key_skips_network(self, mock_request):
+        """Test that a provider without an API key fails without calling out."""
+        self.domains["model_config"] = {}
+
+        self.assertFalse(self.plugin.bridges["venice"].generate("test prompt", os.path.join(self.temp_dir, "x.png")))
+        mock_request.assert_not_called()
+
+    @patch('main.http_request')
+    def test_bridge_http_error_fails(self, mock_request):
+        """Test that an HTTP error status makes the bridge report failure."""
+        mock_request.return_value = (500, b"upstream error")
+
+        self.assertFalse(self.plugin.bridges["venice"].generate("test prompt", os.path.join(self.temp_dir, "x.png")))
+
+    # =============================================================================
+    # BATCH TESTS
+    # =============================================================================
+
+    @patch('main.VeniceBridge.generate')
+    def test_generate_batch_mocked(self, mock_generate):
+        """Test batch generation fans every prompt out to the bridge."""
         mock_generate.return_value = True
 
-        # Generate image through plugin
-        output_path = os.path.join(self.temp_dir, "test_output.png")
+        result = self.plugin.handle_generate_batch({
+            "prompts": ["first prompt", "second prompt", "third prompt"],
+            "provider": "venice"
+        })
+
+        self.assertTrue(result["success"])
+        self.assertEqual(len(result["results"]), 3)
+        self.assertEqual(mock_generate.call_count, 3)
+        urls = {r["image"]["url"] for r in result["results"]}
+        self.assertEqual(len(urls), 3)
 
-        # Call bridge directly (bypasses network)
-        result = mock_generate("test prompt", output_path)
+    def test_generate_batch_without_prompts(self):
+        """Test that batch generation fails without prompts."""
+        result = self.plugin.handle_generate_batch({})
 
-        self.assertTrue(result)
-        mock_generate.assert_called_once()
+        self.assertFalse(result["success"])
+        self.assertEqual(result["error"], "No prompts")
+
+    def test_generate_batch_rejects_invalid_prompts(self):
+        """Test that batch prompts must be a list of non-empty strings."""
+        for prompts in ("a single string", ["ok", ""], ["ok", "   "], ["ok", 42], {"a": "b"}):
+            result = self.plugin.handle_generate_batch({"prompts": prompts})
+
+            self.assertFalse(result["success"], prompts)
+            self.assertEqual(result["error"], "prompts must be a list of non-empty strings")
+
+    @patch('main.VeniceBridge.generate')
+    def test_generate_batch_limit(self, mock_generate):
+        """Test that batches over BATCH_LIMIT are rejected before any generation."""
+        result = self.plugin.handle_generate_batch({"prompts": ["p"] * (BATCH_LIMIT + 1)})
+
+        self.assertFalse(result["success"])
+        self.assertEqual(result["error"], f"At most {BATCH_LIMIT} prompts per batch")
+        mock_generate.assert_not_called()
+
+    @patch('main.VeniceBridge.generate')
+    def test_generate_batch_serializes_face_swap(self, mock_generate):
+        """Test that face swaps from concurrent batch workers never overlap."""
+        mock_generate.return_value = True
+        active, peak = [0], [0]
+
+        def slow_swap(target_path):
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            active[0] -= 1
+            return True
+
+        with patch.object(self.plugin, '_perform_face_swap', side_effect=slow_swap) as swap:
+            result = self.plugin.handle_generate_batch({
+                "prompts": ["a", "b", "c", "d"],
+                "apply_face_swap": True
+            })
+
+        self.assertTrue(result["success"])
+        self.assertEqual(swap.call_count, 4)
+        self.assertEqual(peak[0], 1)
 
 
 # Entry point
@@ -1,4 +1,5 @@
 import logging
+from collections import OrderedDict
 from datetime import datetime
 from typing import Dict, Any
 
@@ -6,12 +7,14 @@ from typing import Dict, Any
 logging.basicConfig(level=logging.INFO, format='[INSPECTOR] %(message)s')
 logger = logging.getLogger("inspector")
 
+MAX_TRACKED_AGENTS = 256 # Least recently logged agents are evicted beyond this
+
 class InspectorPlugin:
     """Plugin for inspecting agent prompts and system state."""
     
     def __init__(self):
         self.kernel = None
-        self.prompt_history = {}  # In-memory storage for prompts
+        self.prompt_history = OrderedDict()  # In-memory LRU of latest prompt per agent
         
     def initialize(self, kernel):
         """Initialize with kernel reference."""
@@ -30,7 +33,10 @@ class InspectorPlugin:
             "timestamp": datetime.now().isoformat(),
             "injected_data": injected_data
         }
-        logger.info(f"Logged prompt for agent: {agent_id}")
+        self.prompt_history.move_to_end(agent_id)
+        if len(self.prompt_history) > MAX_TRACKED_AGENTS:
+            self.prompt_history.popitem(last=False)
+        logger.info("Logged prompt for agent: %s", agent_id)
         return {"success": True}
         
     def handle_get_prompts(self):
@@ -3,17 +3,21 @@ Social Engine Plugin - NPC Autonomy & CRM (v7.0 Stable)
 Refactored for 1:1 Legacy Compliance & v7.0 Architecture (Zero Direct I/O)
 """
 
-import json
+import os
+import time
 import random
 import logging
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, Any, Optional, List
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='[SOCIAL] %(message)s')
 logger = logging.getLogger("social")
 
+FEED_LIMIT = 50 # Newest posts kept in the social_feed domain
+EVENT_TYPES = ("chat", "request", "conflict", "support")
+
 # =============================================================================
 # SOCIAL LOGIC (Refactored for State Manager)
 # =============================================================================
@@ -43,32 +47,36 @@ class SocialPlugin:
 
     def _check_for_autonomous_event(self):
         """Simulate NPC proactivity (Phase 35 Legacy)."""
-        # 1. Check cooldown
-        s_state = self.kernel.state_manager.get_domain("social_state")
-        last_time_str = s_state.get("last_event_time")
-        if last_time_str:
-            last_time = datetime.fromisoformat(last_time_str).replace(tzinfo=None)
-            if (datetime.now() - last_time).total_seconds() / 60 < self.cooldown_minutes:
-                return
-
-        # 2. Roll for chance
+        # 1. Roll for chance (cheapest gate first; most ticks stop here)
         if random.random() > self.trigger_chance:
             return
 
+        ts = time.time()
+        sm = self.kernel.state_manager
+
+        # 2. Check cooldown (epoch float compare; no datetime parsing per tick)
+        s_state = sm.get_domain("social_state")
+        last_epoch = s_state.get("last_event_epoch")
+        if last_epoch is None and s_state.get("last_event_time"):
+            # State saved before epoch tracking: derive it from the ISO string
+            last_epoch = datetime.fromisoformat(s_state["last_event_time"]).timestamp()
+        if last_epoch and ts - last_epoch < self.cooldown_minutes * 60:
+            return
+
         # 3. Pick a random NPC
-        entities = self.kernel.state_manager.get_domain("social_entities") or []
+        entities = sm.get_domain("social_entities") or []
         npcs = [e for e in entities if e.get("type") == "npc"]
         if not npcs: return
         
         npc = random.choice(npcs)
         
         # 4. Generate Event
-        event_types = ["chat", "request", "conflict", "support"]
-        e_type = random.choice(event_types)
+        e_type = random.choice(EVENT_TYPES)
         
+        iso = datetime.fromtimestamp(ts).isoformat()
         new_event = {
-            "id": f"soc_{int(datetime.now().timestamp())}",
-            "timestamp": datetime.now().isoformat(),
+            "id": f"soc_{int(ts)}",
+            "timestamp": iso,
             "sender_id": npc["id"],
             "sender_name": npc["name"],
             "category": e_type,
@@ -76,15 +84,16 @@ class SocialPlugin:
             "processed": False
         }
         
-        # 5. Update Feed & State
-        feed = self.kernel.state_manager.get_domain("social_feed") or []
-        feed.insert(0, new_event)
-        self.kernel.state_manager.update_domain("social_feed", feed[:50])
-        
-        s_state["last_event_time"] = datetime.now().isoformat()
-        self.kernel.state_manager.update_domain("social_state", s_state)
+        # 5. Update Feed & State (feed read fresh so external edits to social_feed are kept)
+        feed = sm.get_domain("social_feed") or []
+        s_state["last_event_time"] = iso
+        s_state["last_event_epoch"] = ts
+        sm.update_domains({
+            "social_feed": ([new_event] + feed)[:FEED_LIMIT],
+            "social_state": s_state
+        })
         
-        logger.info(f"Autonomous social event triggered: {npc['name']} ({e_type})")
+        logger.info("Autonomous social event triggered: %s (%s)", npc["name"], e_type)
         self._fire_event("EVENT_SOCIAL_POST", new_event)
 
     def _fire_event(self, event_type, data):
@@ -105,7 +114,9 @@ class SocialPlugin:
     def handle_add_entity(self, data: Dict[str, Any]):
         """API Handler: POST /v1/plugins/social/add"""
         entities = self.kernel.state_manager.get_domain("social_entities") or []
-        new_id = data.get("id", f"ent_{len(entities)}")
+        new_id = data.get("id") or f"ent_{os.urandom(4).hex()}"
+        if any(e.get("id") == new_id for e in entities):
+            return {"success": False, "error": "Entity already exists"}
         
         new_entity = {
             "id": new_id,
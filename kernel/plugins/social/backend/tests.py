@@ -6,6 +6,8 @@ Tests the social intelligence engine that drives social extroversion.
 
 import sys
 import os
+import json
+import tempfile
 import importlib.util
 from datetime import datetime
 from unittest.mock import MagicMock
@@ -13,6 +15,11 @@ from unittest.mock import MagicMock
 # Calculate paths
 TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
 MAIN_PATH = os.path.join(TESTS_DIR, "main.py")
+MANIFEST_PATH = os.path.join(os.path.dirname(TESTS_DIR), "manifest.json")
+
+# Add project root to path (parent of kernel/) for the real StateManager
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(TESTS_DIR)))))
+from kernel.core.state_server import StateManager
 
 
 class MockStateManager:
@@ -165,6 +172,33 @@ def test_list_entities():
     print("[PASS] List entities returns all NPCs")
 
 
+def test_minutely_tick_posts_with_real_state_manager():
+    """Test the subscribed tick drives an autonomous post through a real StateManager."""
+    with open(MANIFEST_PATH) as f:
+        subscribes = json.load(f)["events"]["subscribes"]
+    assert "TICK_MINUTELY" in subscribes, f"on_event acts on TICK_MINUTELY; manifest subscribes {subscribes}"
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        kernel = MagicMock(event_bus=None)
+        kernel.state_manager = StateManager(data_dir)
+        plugin = social_main.SocialPlugin()
+        plugin.initialize(kernel)
+        plugin.trigger_chance = 1.0
+
+        plugin.on_event({"event": "TICK_MINUTELY"})
+        plugin.on_event({"event": "TICK_MINUTELY"}) # Inside the cooldown
+
+        feed = kernel.state_manager.get_domain("social_feed")
+        assert len(feed) == 1, f"Expected one post within the cooldown, got {len(feed)}"
+        assert feed[0]["sender_id"] == "dr_k", "Only NPC entities should post"
+        with open(os.path.join(data_dir, "social_state.json")) as f:
+            assert json.load(f)["last_event_epoch"], "Cooldown should be persisted"
+        with open(os.path.join(data_dir, "social_feed.json")) as f:
+            assert json.load(f) == feed, "Feed should be persisted"
+
+    print("[PASS] Minutely tick posts through the real StateManager")
+
+
 def main():
     """Run all SOCIAL plugin tests."""
     print("=" * 60)
@@ -177,6 +211,7 @@ def main():
         test_trade_social_impact,
         test_hourly_tick_simulates_activity,
         test_list_entities,
+        test_minutely_tick_posts_with_real_state_manager,
     ]
 
     passed = 0
@@ -3,7 +3,7 @@ Spatial Engine Plugin - Interior, Items & Locations (v7.0 Stable)
 Refactored for 1:1 Legacy Compliance & v7.0 Architecture
 """
 
-import json
+import copy
 import logging
 import asyncio
 from datetime import datetime
@@ -13,6 +13,25 @@ from typing import Dict, Any, Optional, List
 logging.basicConfig(level=logging.INFO, format='[SPATIAL] %(message)s')
 logger = logging.getLogger("spatial")
 
+# Domains this plugin owns; update requests for anything else are rejected
+COMPONENTS = frozenset({"interior", "inventory", "wardrobe"})
+
+# Seed templates; always deep-copied so stored domains never alias them
+DEFAULT_INTERIOR = {
+    "rooms": [
+        {"id": "home_office", "name": "Home Office", "items": ["PC", "Desk", "Chair"]},
+        {"id": "living_room", "name": "Living Room", "items": ["Sofa", "TV", "Bookshelf"]},
+        {"id": "bedroom", "name": "Bedroom", "items": ["Bed", "Wardrobe"]}
+    ]
+}
+DEFAULT_WARDROBE = {
+    "outfits": [
+        {"id": "casual", "name": "Casual Comfort", "parts": ["T-Shirt", "Jeans"]},
+        {"id": "professional", "name": "Neural Tech", "parts": ["Suit", "Glasses"]}
+    ],
+    "current_outfit": "casual"
+}
+
 # =============================================================================
 # SPATIAL LOGIC
 # =============================================================================
@@ -24,25 +43,12 @@ class SpatialPlugin:
     def initialize(self, kernel):
         self.kernel = kernel
         
-        # Initial State: Interior
-        if not self.kernel.state_manager.get_domain("interior"):
-            self.kernel.state_manager.update_domain("interior", {
-                "rooms": [
-                    {"id": "home_office", "name": "Home Office", "items": ["PC", "Desk", "Chair"]},
-                    {"id": "living_room", "name": "Living Room", "items": ["Sofa", "TV", "Bookshelf"]},
-                    {"id": "bedroom", "name": "Bedroom", "items": ["Bed", "Wardrobe"]}
-                ]
-            })
-            
-        # Initial State: Wardrobe
-        if not self.kernel.state_manager.get_domain("wardrobe"):
-            self.kernel.state_manager.update_domain("wardrobe", {
-                "outfits": [
-                    {"id": "casual", "name": "Casual Comfort", "parts": ["T-Shirt", "Jeans"]},
-                    {"id": "professional", "name": "Neural Tech", "parts": ["Suit", "Glasses"]}
-                ],
-                "current_outfit": "casual"
-            })
+        # Initial State: seed any missing domains in one batched write
+        defaults = {"interior": DEFAULT_INTERIOR, "wardrobe": DEFAULT_WARDROBE}
+        missing = {name: copy.deepcopy(template) for name, template in defaults.items()
+                   if not self.kernel.state_manager.get_domain(name)}
+        if missing:
+            self.kernel.state_manager.update_domains(missing)
             
         logger.info("Spatial Engine initialized (v7.0)")
 
@@ -60,10 +66,10 @@ class SpatialPlugin:
 
     def handle_update_component(self, data: Dict[str, Any]):
         component = data.get("component")
-        value = data.get("value")
         if not component: return {"success": False, "error": "No component"}
-        
-        self.kernel.state_manager.update_domain(component, value)
+        if component not in COMPONENTS: return {"success": False, "error": f"Unknown component: {component}"}
+
+        self.kernel.state_manager.update_domain(component, data.get("value"))
         return {"success": True}
 
 # Singleton instance
@@ -3,73 +3,63 @@
 Spatial Plugin Unit Tests - Interior, Inventory & Wardrobe Logic
 
 Tests the spatial engine to ensure:
-- Inventory management works correctly
-- Wardrobe items can be added and worn
-- Outfits can be saved and applied
+- Missing domains are seeded from the module templates in one write
+- Interior, inventory and wardrobe handlers serve the stored domains
+- Component updates round-trip and stay limited to spatial domains
+- Entity events leave the stored state alone
 
 Uses mocked kernel and state_manager.
 """
 
 import sys
 import os
+import copy
 import importlib.util
-from unittest.mock import MagicMock
-from datetime import datetime
+from collections import Counter
 
 # Calculate paths
 TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
 MAIN_PATH = os.path.join(TESTS_DIR, "main.py")
 
-# Add tests directory to path for imports
-sys.path.insert(0, TESTS_DIR)
+# Pristine mock state; every fresh state manager and per-test reset deep-copies it
+DEFAULT_STATE = {
+    "interior": {
+        "rooms": [
+            {"id": "bedroom", "name": "Bedroom", "items": ["Bed", "Wardrobe"]}
+        ]
+    },
+    "inventory": {
+        "items": ["Phone", "Coffee Mug"]
+    },
+    "wardrobe": {
+        "outfits": [
+            {"id": "casual", "name": "Casual Comfort", "parts": ["T-Shirt", "Jeans"]}
+        ],
+        "current_outfit": "casual"
+    }
+}
 
 
 class MockStateManager:
     def __init__(self):
-        self._data = {
-            "interior": {
-                "rooms": [],
-                "current_room": None,
-                "entity_position": {"x": 0, "y": 0, "z": 0},
-                "entity_rotation": {"x": 0, "y": 0, "z": 0, "w": 1},
-                "last_updated": None
-            },
-            "inventory": {
-                "items": [],
-                "held_item": None,
-                "categories": ["electronics", "books", "consumables", "hobby", "tools", "media", "other"],
-                "last_updated": None
-            },
-            "wardrobe": {
-                "inventory": {
-                    "underwear": [],
-                    "tops": [],
-                    "bottoms": [],
-                    "socks": [],
-                    "shoes": [],
-                    "accessories": [],
-                    "jewelry": [],
-                    "outerwear": [],
-                    "objects": []
-                },
-                "outfits": {},
-                "current_outfit": None,
-                "worn_items": {},
-                "last_updated": None
-            }
-        }
+        self._data = copy.deepcopy(DEFAULT_STATE)
+        self.batches = [] # Domain names of every update_domains call
 
     def get_domain(self, domain):
-        return self._data.get(domain)
+        return self._data.get(domain, {})
 
     def update_domain(self, domain, data):
         self._data[domain] = data
 
+    def update_domains(self, updates):
+        self.batches.append(sorted(updates))
+        self._data.update(updates)
+
 
 class MockKernel:
     def __init__(self):
         self.state_manager = MockStateManager()
-        self.publish_event = MagicMock()
+        self.event_bus = None
 
 
 # Create mock kernel
@@ -77,447 +67,161 @@ mock_kernel = MockKernel()
 
 
 def reset_mock_kernel():
-    """Reset the mock kernel state for fresh tests."""
-    mock_kernel.state_manager._data = {
-        "interior": {
-            "rooms": [],
-            "current_room": None,
-            "entity_position": {"x": 0, "y": 0, "z": 0},
-            "entity_rotation": {"x": 0, "y": 0, "z": 0, "w": 1},
-            "last_updated": None
-        },
-        "inventory": {
-            "items": [],
-            "held_item": None,
-            "categories": ["electronics", "books", "consumables", "hobby", "tools", "media", "other"],
-            "last_updated": None
-        },
-        "wardrobe": {
-            "inventory": {
-                "underwear": [],
-                "tops": [],
-                "bottoms": [],
-                "socks": [],
-                "shoes": [],
-                "accessories": [],
-                "jewelry": [],
-                "outerwear": [],
-                "objects": []
-            },
-            "outfits": {},
-            "current_outfit": None,
-            "worn_items": {},
-            "last_updated": None
-        }
-    }
-
-# Load the plugin module directly
-spec = importlib.util.spec_from_file_location("main", MAIN_PATH)
-spatial_main = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(spatial_main)
-
-# Alias as main module for imports
-sys.modules['main'] = spatial_main
-
-
-# =============================================================================
-# TESTS
-# =============================================================================
-
-def test_add_inventory_item():
-    """Test adding an item to inventory."""
-    from main import SpatialPlugin
-
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
-
-    item = {
-        "name": "Laptop",
-        "category": "electronics",
-        "description": "Work laptop"
-    }
-
-    result = plugin.add_inventory_item(item)
-
-    assert result["success"] is True
-    assert "item_id" in result
-
-    # Verify in state
-    inventory = mock_kernel.state_manager.get_domain("inventory")
-    assert len(inventory["items"]) == 1
-    assert inventory["items"][0]["name"] == "Laptop"
-
-    print("[PASS] Adding inventory item works")
-
-
-def test_remove_inventory_item():
-    """Test removing an item from inventory."""
-    reset_mock_kernel()
-    from main import SpatialPlugin
-
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
-
-    # Add item first
-    item = {"name": "Phone", "category": "electronics"}
-    result = plugin.add_inventory_item(item)
-    item_id = result["item_id"]
-
-    # Remove it
-    result = plugin.remove_inventory_item(item_id)
-
-    assert result["success"] is True
-
-    # Verify removed
-    inventory = mock_kernel.state_manager.get_domain("inventory")
-    assert len(inventory["items"]) == 0
-
-    print("[PASS] Removing inventory item works")
-
-
-def test_hold_item():
-    """Test setting an item as held."""
-    from main import SpatialPlugin
-
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
-
-    # Add item
-    item = {"name": "Coffee Mug", "category": "consumables"}
-    result = plugin.add_inventory_item(item)
-    item_id = result["item_id"]
-
-    # Hold it
-    result = plugin.hold_item(item_id)
-
-    assert result["success"] is True
-
-    # Verify held
-    inventory = mock_kernel.state_manager.get_domain("inventory")
-    assert inventory["held_item"] == item_id
-
-    print("[PASS] Holding item works")
-
-
-def test_add_wardrobe_item():
-    """Test adding an item to wardrobe."""
-    from main import SpatialPlugin
-
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
-
-    item = {
-        "name": "Blue T-Shirt",
-        "color": "blue",
-        "brand": "Nike"
-    }
-
-    result = plugin.add_wardrobe_item("tops", item)
-
-    assert result["success"] is True
-    assert "item_id" in result
-
-    # Verify in state
-    wardrobe = mock_kernel.state_manager.get_domain("wardrobe")
-    assert len(wardrobe["inventory"]["tops"]) == 1
-    assert wardrobe["inventory"]["tops"][0]["name"] == "Blue T-Shirt"
-
-    print("[PASS] Adding wardrobe item works")
-
-
-def test_wear_item():
-    """Test wearing an item from wardrobe."""
-    from main import SpatialPlugin
-
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
-
-    # Add item to wardrobe
-    item = {"name": "Black Jeans", "color": "black"}
-    result = plugin.add_wardrobe_item("bottoms", item)
-    item_id = result["item_id"]
-
-    # Get wardrobe
-    wardrobe = mock_kernel.state_manager.get_domain("wardrobe")
-
-    # Wear the item
-    plugin._wear_item(wardrobe, "bottoms", item_id)
-
-    assert "bottoms" in wardrobe["worn_items"]
-    assert wardrobe["worn_items"]["bottoms"]["name"] == "Black Jeans"
-
-    print("[PASS] Wearing item works")
-
-
-def test_save_outfit():
-    """Test saving an outfit."""
-    from main import SpatialPlugin
-
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
-
-    # Add items to wardrobe first
-    plugin.add_wardrobe_item("tops", {"name": "White Shirt"})
-    plugin.add_wardrobe_item("bottoms", {"name": "Slacks"})
-
-    # Save outfit
-    item_names = {
-        "tops": "White Shirt",
-        "bottoms": "Slacks"
-    }
-
-    result = plugin.save_outfit("Business", item_names)
-
-    assert result["success"] is True
-
-    # Verify saved
-    wardrobe = mock_kernel.state_manager.get_domain("wardrobe")
-    assert "Business" in wardrobe["outfits"]
-
-    print("[PASS] Saving outfit works")
-
-
-def test_change_outfit():
-    """Test applying a saved outfit."""
-    from main import SpatialPlugin
-
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
-
-    # Add items
-    plugin.add_wardrobe_item("tops", {"name": "Hoodie"})
-    plugin.add_wardrobe_item("bottoms", {"name": "Jeans"})
-
-    # Save outfit
-    plugin.save_outfit("Casual", {"tops": "Hoodie", "bottoms": "Jeans"})
-
-    # Get wardrobe
-    wardrobe = mock_kernel.state_manager.get_domain("wardrobe")
+    """Reset the shared mock kernel state for fresh tests."""
+    mock_kernel.state_manager._data = copy.deepcopy(DEFAULT_STATE)
+    mock_kernel.state_manager.batches = []
 
-    # Change outfit
-    plugin._change_outfit(wardrobe, "Casual")
 
-    assert wardrobe["current_outfit"] == "Casual"
-    assert "tops" in wardrobe["worn_items"]
-    assert wardrobe["worn_items"]["tops"]["name"] == "Hoodie"
+# Load main.py under its own module name rather than shadowing a generic "main"
+if "spatial_main" in sys.modules:
+    spatial_main = sys.modules["spatial_main"]
+else:
+    spec = importlib.util.spec_from_file_location("spatial_main", MAIN_PATH)
+    spatial_main = importlib.util.module_from_spec(spec)
+    sys.modules["spatial_main"] = spatial_main
+    spec.loader.exec_module(spatial_main)
 
-    print("[PASS] Changing outfit works")
+SpatialPlugin = spatial_main.SpatialPlugin
 
 
-def test_remove_wardrobe_item():
-    """Test removing item from wardrobe."""
-    from main import SpatialPlugin
-
+def make_plugin():
+    """SpatialPlugin initialized against the shared mock kernel."""
     plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
-
-    # Add item
-    item = {"name": "Sneakers"}
-    result = plugin.add_wardrobe_item("shoes", item)
-    item_id = result["item_id"]
-
-    # Remove it
-    result = plugin.remove_wardrobe_item("shoes", item_id)
-
-    assert result["success"] is True
-
-    # Verify removed
-    wardrobe = mock_kernel.state_manager.get_domain("wardrobe")
-    assert len(wardrobe["inventory"]["shoes"]) == 0
-
-    print("[PASS] Removing wardrobe item works")
-
-
-def test_delete_outfit():
-    """Test deleting a saved outfit."""
-    from main import SpatialPlugin
-
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
-
-    # Save outfit
-    plugin.save_outfit("Test Outfit", {"tops": "Shirt"})
-
-    # Delete it
-    result = plugin.delete_outfit("Test Outfit")
-
-    assert result["success"] is True
-
-    # Verify deleted
-    wardrobe = mock_kernel.state_manager.get_domain("wardrobe")
-    assert "Test Outfit" not in wardrobe["outfits"]
-
-    print("[PASS] Deleting outfit works")
+    plugin.initialize(mock_kernel)
+    return plugin
 
 
-def test_entity_move_room():
-    """Test entity movement to a new room (ENTITY_MOVE event)."""
-    from main import SpatialPlugin
+# =============================================================================
+# TESTS
+# =============================================================================
 
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
+def test_initialize_seeds_missing_domains():
+    """Test that missing interior and wardrobe are seeded in one batched write."""
+    test_kernel = MockKernel()
+    test_kernel.state_manager._data = {}
 
-    # Set up rooms in interior
-    interior = mock_kernel.state_manager.get_domain("interior")
-    interior["rooms"] = [
-        {"id": "living_room", "name": "Living Room", "furniture": []},
-        {"id": "bedroom", "name": "Bedroom", "furniture": []}
-    ]
-    mock_kernel.state_manager.update_domain("interior", interior)
+    SpatialPlugin().initialize(test_kernel)
 
-    # Send ENTITY_MOVE event
-    event = {
-        "event": "ENTITY_MOVE",
-        "room_id": "bedroom"
-    }
+    sm = test_kernel.state_manager
+    assert sm.batches == [["interior", "wardrobe"]], f"Expected one batch for both domains: {sm.batches}"
+    assert sm._data["interior"] == spatial_main.DEFAULT_INTERIOR
+    assert sm._data["wardrobe"] == spatial_main.DEFAULT_WARDROBE
+    assert sm._data["interior"] is not spatial_main.DEFAULT_INTERIOR, "Seed must not alias the module default"
+    sm._data["wardrobe"]["outfits"].clear()
+    assert spatial_main.DEFAULT_WARDROBE["outfits"], "Mutating a seeded domain must not touch the template"
 
-    plugin.on_event(event)
+    print("[PASS] Missing domains are seeded in one write")
 
-    # Verify room change
-    interior = mock_kernel.state_manager.get_domain("interior")
-    assert interior["current_room"] == "bedroom"
 
-    print("[PASS] Entity move to room works")
+def test_initialize_seeds_only_missing():
+    """Test that existing domains are kept and only the missing ones are written."""
+    del mock_kernel.state_manager._data["wardrobe"]
 
+    make_plugin()
 
-def test_entity_move_with_furniture():
-    """Test entity movement to furniture (ENTITY_MOVE event with position)."""
-    from main import SpatialPlugin
+    sm = mock_kernel.state_manager
+    assert sm.batches == [["wardrobe"]], f"Only wardrobe should be seeded: {sm.batches}"
+    assert sm._data["interior"] == DEFAULT_STATE["interior"], "Existing interior was overwritten"
 
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
-
-    # Set up room with furniture
-    interior = mock_kernel.state_manager.get_domain("interior")
-    interior["rooms"] = [
-        {"id": "bedroom", "name": "Bedroom", "furniture": [
-            {"id": "bed_1", "name": "Bed", "position": {"x": 2, "y": 0, "z": 3}}
-        ]}
-    ]
-    interior["current_room"] = "bedroom"
-    mock_kernel.state_manager.update_domain("interior", interior)
-
-    # Move to furniture
-    event = {
-        "event": "ENTITY_MOVE",
-        "room_id": "bedroom",
-        "furniture_id": "bed_1",
-        "position": {"x": 2.5, "y": 0.5, "z": 3.2}
-    }
-
-    plugin.on_event(event)
+    make_plugin()
+    assert len(sm.batches) == 1, "Nothing should be written when every domain exists"
 
-    # Verify position update
-    interior = mock_kernel.state_manager.get_domain("interior")
-    assert interior["entity_position"]["x"] == 2.5
-    assert interior["entity_position"]["y"] == 0.5
-    assert interior["entity_position"]["z"] == 3.2
+    print("[PASS] Only missing domains are seeded")
 
-    print("[PASS] Entity move to furniture works")
 
+def test_handle_get_interior():
+    """Test get interior API handler."""
+    result = make_plugin().handle_get_interior()
 
-def test_entity_dress_event():
-    """Test ENTITY_DRESS event for wearing items."""
-    from main import SpatialPlugin
+    assert result == DEFAULT_STATE["interior"], f"Unexpected interior: {result}"
 
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
-
-    # Add item to wardrobe
-    result = plugin.add_wardrobe_item("tops", {"name": "Red Shirt"})
-    item_id = result["item_id"]
-
-    # Send ENTITY_DRESS event
-    event = {
-        "event": "ENTITY_DRESS",
-        "action": "wear",
-        "category": "tops",
-        "item_id": item_id
-    }
+    print("[PASS] Get interior API works")
 
-    plugin.on_event(event)
 
-    # Verify worn
-    wardrobe = mock_kernel.state_manager.get_domain("wardrobe")
-    assert "tops" in wardrobe["worn_items"]
-    assert wardrobe["worn_items"]["tops"]["name"] == "Red Shirt"
-
-    print("[PASS] Entity dress event works")
+def test_handle_get_inventory():
+    """Test get inventory API handler, including the empty default."""
+    plugin = make_plugin()
 
+    assert plugin.handle_get_inventory() == DEFAULT_STATE["inventory"]
 
-def test_domain_updates():
-    """Test that interior, inventory, and wardrobe domains are properly updated."""
-    reset_mock_kernel()
-    from main import SpatialPlugin
+    del mock_kernel.state_manager._data["inventory"]
+    assert plugin.handle_get_inventory() == {"items": []}, "Missing inventory should default to no items"
 
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
+    print("[PASS] Get inventory API works")
 
-    # Update interior domain
-    interior = mock_kernel.state_manager.get_domain("interior")
-    interior["current_room"] = "kitchen"
-    mock_kernel.state_manager.update_domain("interior", interior)
 
-    # Update inventory domain
-    plugin.add_inventory_item({"name": "Test Item"})
+def test_handle_get_wardrobe():
+    """Test get wardrobe API handler."""
+    result = make_plugin().handle_get_wardrobe()
 
-    # Update wardrobe domain
-    plugin.add_wardrobe_item("tops", {"name": "Test Shirt"})
+    assert result["current_outfit"] == "casual"
+    assert [outfit["id"] for outfit in result["outfits"]] == ["casual"]
 
-    # Verify all domains exist and are updated
-    interior = mock_kernel.state_manager.get_domain("interior")
-    inventory = mock_kernel.state_manager.get_domain("inventory")
-    wardrobe = mock_kernel.state_manager.get_domain("wardrobe")
+    print("[PASS] Get wardrobe API works")
 
-    assert interior is not None
-    assert "current_room" in interior
-    assert interior["current_room"] == "kitchen"
 
-    assert inventory is not None
-    assert len(inventory["items"]) == 1
+def test_handle_update_component_round_trip():
+    """Test that an updated component is served back by its handler."""
+    plugin = make_plugin()
+    wardrobe = dict(plugin.handle_get_wardrobe(), current_outfit="professional")
 
-    assert wardrobe is not None
-    assert len(wardrobe["inventory"]["tops"]) == 1
+    result = plugin.handle_update_component({"component": "wardrobe", "value": wardrobe})
 
-    print("[PASS] All domains (interior, inventory, wardrobe) updated correctly")
+    assert result == {"success": True}
+    assert plugin.handle_get_wardrobe()["current_outfit"] == "professional"
 
+    print("[PASS] Update component round-trips")
 
-def test_handle_get_inventory():
-    """Test get inventory API handler."""
-    from main import SpatialPlugin
 
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
+def test_handle_update_component_whitelist():
+    """Test that updates are limited to the interior, inventory and wardrobe domains."""
+    plugin = make_plugin()
 
-    result = plugin.handle_get_inventory()
+    result = plugin.handle_update_component({"component": "inventory", "value": {"items": ["Lamp"]}})
+    assert result == {"success": True}
+    assert mock_kernel.state_manager.get_domain("inventory") == {"items": ["Lamp"]}
 
-    assert "items" in result
-    assert "held_item" in result
-    assert "categories" in result
+    for component in ("model_config", "vault_state", "interiors"):
+        result = plugin.handle_update_component({"component": component, "value": {}})
+        assert result == {"success": False, "error": f"Unknown component: {component}"}, result
+        assert component not in mock_kernel.state_manager._data, f"{component} must not be written"
 
-    print("[PASS] Get inventory API works")
+    assert plugin.handle_update_component({}) == {"success": False, "error": "No component"}
 
+    print("[PASS] Update component is limited to spatial domains")
 
-def test_handle_get_wardrobe():
-    """Test get wardrobe API handler."""
-    from main import SpatialPlugin
 
-    plugin = SpatialPlugin()
-    plugin.kernel = mock_kernel
+def test_entity_events_leave_state_unchanged():
+    """Test that subscribed ENTITY_MOVE / ENTITY_DRESS events do not modify spatial state."""
+    plugin = make_plugin()
 
-    result = plugin.handle_get_wardrobe()
+    plugin.on_event({"event": "ENTITY_MOVE", "room_id": "bedroom"})
+    plugin.on_event({"event": "ENTITY_DRESS", "action": "wear", "category": "tops", "item_id": "x"})
 
-    assert "inventory" in result
-    assert "outfits" in result
-    assert "worn_items" in result
+    assert mock_kernel.state_manager._data == DEFAULT_STATE, "Entity events should not modify state"
 
-    print("[PASS] Get wardrobe API works")
+    print("[PASS] Entity events leave state unchanged")
 
 
 # =============================================================================
 # MAIN
 # =============================================================================
 
+def _run(test):
+    """Run one test against fresh mock state; return "pass", "fail" or "error"."""
+    print(f"\n>>> Running: {test.__name__}")
+    reset_mock_kernel()
+    try:
+        test()
+        return "pass"
+    except AssertionError as e:
+        print(f"[FAIL] {test.__name__}: {e}")
+        return "fail"
+    except Exception as e:
+        print(f"[ERROR] {test.__name__}: {e}")
+        return "error"
+
+
 def main():
     """Run all Spatial plugin tests."""
     print("=" * 60)
@@ -525,37 +229,19 @@ def main():
     print("=" * 60)
 
     tests = [
-        test_add_inventory_item,
-        test_remove_inventory_item,
-        test_hold_item,
-        test_add_wardrobe_item,
-        test_wear_item,
-        test_save_outfit,
-        test_change_outfit,
-        test_remove_wardrobe_item,
-        test_delete_outfit,
+        test_initialize_seeds_missing_domains,
+        test_initialize_seeds_only_missing,
+        test_handle_get_interior,
         test_handle_get_inventory,
         test_handle_get_wardrobe,
-        test_entity_move_room,
-        test_entity_move_with_furniture,
-        test_entity_dress_event,
-        test_domain_updates,
+        test_handle_update_component_round_trip,
+        test_handle_update_component_whitelist,
+        test_entity_events_leave_state_unchanged,
     ]
 
-    passed = 0
-    failed = 0
-
-    for test in tests:
-        try:
-            print(f"\n>>> Running: {test.__name__}")
-            test()
-            passed += 1
-        except AssertionError as e:
-            print(f"[FAIL] {test.__name__}: {e}")
-            failed += 1
-        except Exception as e:
-            print(f"[ERROR] {test.__name__}: {e}")
-            failed += 1
+    results = Counter(_run(test) for test in tests)
+    passed = results["pass"]
+    failed = results["fail"] + results["error"]
 
     print("\n" + "=" * 60)
     print(f"RESULTS: {passed} passed, {failed} failed")
@@ -3,21 +3,33 @@ Vault Plugin - Economy & Trading Engine (v7.0 Stable)
 Ported 1:1 from project-genesis Legacy (vault_bridge.py)
 """
 
-import json
 import time
 import logging
-import urllib.request
-import urllib.error
 import hmac
 import hashlib
 import base64
+import threading
 from datetime import datetime
 from typing import Dict, Any, Optional
 
+from kernel.core.http_pool import request as http_request
+from kernel.core.json_codec import loads as _json_loads
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='[VAULT] %(message)s')
 logger = logging.getLogger("vault")
 
+TX_HISTORY_LIMIT = 200 # Recent transactions kept in vault_state; the full ledger lives in vault_ledger
+PRICE_TTL = 3.0 # Seconds a fetched ticker price is reused (override via vault_state.price_ttl)
+RETRY_STATUSES = frozenset({502, 503, 504, 520}) # Transient Kraken/Cloudflare gateway errors
+MAX_RETRIES = 2
+RATE_LIMIT_MAX = 15.0 # Kraken API counter ceiling (tokens)
+RATE_LIMIT_REFILL = 0.5 # Tokens regained per second
+KRAKEN_PAIRS = {
+    "BTC": "XXBTZUSD", "ETH": "XETHZUSD", "SOL": "SOLUSD",
+    "XRP": "XXRPZUSD", "ADA": "ADAUSD", "DOGE": "XDGUSD"
+}
+
 # =============================================================================
 # TRADING BRIDGES
 # =============================================================================
@@ -35,16 +47,24 @@ class BaseBridge:
             "transactions": []
         }
 
-    def save_state(self, state):
-        state["last_updated"] = datetime.now().isoformat()
+    def save_state(self, state, timestamp: Optional[str] = None):
+        state["last_updated"] = timestamp or datetime.now().isoformat()
         self.state_manager.update_domain("vault_state", state)
 
 class KrakenBridge(BaseBridge):
+    # Shared across bridge instances so a config re-init keeps warm prices
+    _price_cache: Dict[str, tuple] = {} # pair -> (price, expiry on time.monotonic())
+    _price_lock = threading.Lock()
+    _pair_names: Dict[str, str] = {} # pair name or altname -> canonical AssetPairs key; loaded once
+    API_HOST = "api.kraken.com"
+    # Client-side token bucket mirroring Kraken's call counter; strikes count consecutive rate-limit errors
+    _bucket = {"tokens": RATE_LIMIT_MAX, "ts": time.monotonic(), "strikes": 0}
+    _bucket_lock = threading.Lock()
+
     def __init__(self, state_manager, api_key="", api_secret="", paper=True):
         super().__init__(state_manager, paper)
         self.api_key = api_key
         self.api_secret = api_secret
-        self.base_url = "https://api.kraken.com"
 
     def get_status(self):
         state = self.get_state()
@@ -54,35 +74,190 @@ class KrakenBridge(BaseBridge):
             "provider": "kraken",
             "balances": state.get("balances", {}),
             "positions": state.get("positions", {}),
+            "positions_value": state.get("positions_value"),
+            "last_sync": state.get("last_sync"),
+            "unpriced": state.get("unpriced", []),
             "transactions": state.get("transactions", [])[:20]
         }
 
+    @staticmethod
+    def _pair(symbol: str) -> str:
+        return KRAKEN_PAIRS.get(symbol, f"{symbol}USD")
+
+    def _cached_price(self, pair: str) -> Optional[float]:
+        with self._price_lock:
+            hit = self._price_cache.get(pair)
+        if hit and hit[1] > time.monotonic():
+            return hit[0]
+        return None
+
+    def _acquire(self, cost: float = 1.0, wait: bool = True) -> bool:
+        """Reserve cost tokens; sleep until they refill, or return False without reserving if not wait."""
+        with self._bucket_lock:
+            bucket = self._bucket
+            now = time.monotonic()
+            bucket["tokens"] = min(RATE_LIMIT_MAX, bucket["tokens"] + (now - bucket["ts"]) * RATE_LIMIT_REFILL)
+            bucket["ts"] = now
+            if bucket["tokens"] < cost and not wait:
+                return False
+            bucket["tokens"] -= cost
+            delay = -bucket["tokens"] / RATE_LIMIT_REFILL if bucket["tokens"] < 0 else 0
+        if delay:
+            time.sleep(delay)
+        return True
+
+    def _record_rate_limit(self, limited: bool):
+        """Empty the bucket with exponential back-off after a rate-limit error; reset on success."""
+        with self._bucket_lock:
+            bucket = self._bucket
+            if not limited:
+                bucket["strikes"] = 0
+                return
+            bucket["strikes"] = min(bucket["strikes"] + 1, 5)
+            bucket["tokens"] = -(2 ** bucket["strikes"]) * RATE_LIMIT_REFILL
+            bucket["ts"] = time.monotonic()
+
+    def get_json(self, path: str, attempt: int = 0, cost: float = 1.0, wait: bool = True) -> Any:
+        """GET from API_HOST over a reused HTTPS connection and decode the JSON reply.
+
+        With wait=False nothing sleeps: an empty rate-limit bucket raises at once and gateway
+        errors are not retried, so callers on the HTTP server thread can fall back instead.
+        """
+        if not self._acquire(cost, wait):
+            raise RuntimeError("Rate limit budget exhausted")
+        status, body = http_request(self.API_HOST, "GET", path, timeout=5)
+        if status in RETRY_STATUSES and wait and attempt < MAX_RETRIES:
+            time.sleep(0.5 * (attempt + 1))
+            return self.get_json(path, attempt + 1, cost, wait)
+        if status >= 400:
+            raise RuntimeError(f"HTTP {status}: {body[:200]!r}")
+        return _json_loads(body)
+
+    def _public(self, path: str, wait: bool = True) -> Any:
+        """Fetch a public endpoint and return its result, raising on Kraken-reported errors."""
+        data = self.get_json(path, wait=wait) # SAFE: External API fetch
+        errors = data.get("error")
+        self._record_rate_limit(any("Rate limit" in e for e in errors or ()))
+        if errors:
+            raise Exception(str(errors))
+        return data["result"]
+
+    def _canonical_pairs(self, wait: bool = True) -> Dict[str, str]:
+        """Pair name/altname -> canonical key, from AssetPairs on first use."""
+        if not self._pair_names:
+            names = {}
+            for key, info in self._public("/0/public/AssetPairs", wait).items():
+                names[key] = key
+                names[info.get("altname", key)] = key
+            KrakenBridge._pair_names = names
+        return self._pair_names
+
+    def get_prices(self, symbols, wait: bool = True) -> Dict[str, float]:
+        """Last trade price per symbol; all cache misses share one Ticker request.
+
+        Symbols Kraken does not list are left out of the result, so the caller sees them as unpriced
+        instead of one unknown pair failing the whole batch. wait is passed on to get_json.
+        """
+        prices = {}
+        missing = {} # pair -> symbol
+        for symbol in symbols:
+            symbol = symbol.upper()
+            pair = self._pair(symbol)
+            cached = self._cached_price(pair)
+            if cached is not None:
+                prices[symbol] = cached
+            else:
+                missing[pair] = symbol
+        if not missing:
+            return prices
+
+        # Ticker replies under canonical names (LTCUSD -> XLTCZUSD); ask and match by those
+        names = self._canonical_pairs(wait)
+        wanted = {names[pair]: pair for pair in missing if pair in names}
+        if not wanted:
+            return prices
+        # Kraken ticker response is complex, get the last trade price
+        result = self._public(f"/0/public/Ticker?pair={','.join(wanted)}", wait)
+
+        expiry = time.monotonic() + self.get_state().get("price_ttl", PRICE_TTL)
+        with self._price_lock:
+            for canonical, ticker in result.items():
+                pair = wanted.get(canonical)
+                if pair is None: continue
+                price = float(ticker["c"][0])
+                self._price_cache[pair] = (price, expiry)
+                prices[missing[pair]] = price
+        return prices
+
     def get_price(self, symbol: str):
-        symbol_map = {
-            "BTC": "XXBTZUSD", "ETH": "XETHZUSD", "SOL": "SOLUSD",
-            "XRP": "XXRPZUSD", "ADA": "ADAUSD", "DOGE": "XDGUSD"
-        }
-        pair = symbol_map.get(symbol.upper(), f"{symbol}USD")
+        symbol = symbol.upper()
+        cached = self._cached_price(self._pair(symbol))
+        if cached is not None:
+            return {"success": True, "price": cached, "cached": True}
         
-        # Real price fetch (public API)
+        # Real price fetch (public API); runs on the HTTP server thread, so never wait on the rate limit
         try:
-            url = f"{self.base_url}/0/public/Ticker?pair={pair}"
-            with urllib.request.urlopen(url, timeout=5) as response: # SAFE: External API fetch
-                data = json.loads(response.read().decode())
-                if data.get("error"):
-                    raise Exception(str(data["error"]))
-                # Kraken ticker response is complex, get the last trade price
-                result = data["result"]
-                pair_key = list(result.keys())[0]
-                price = float(result[pair_key]["c"][0])
-                return {"success": True, "price": price}
+            price = self.get_prices([symbol], wait=False).get(symbol)
+            if price is None:
+                raise Exception(f"No ticker for {symbol}")
+            return {"success": True, "price": price}
         except Exception as e:
             logger.error(f"Price fetch error for {symbol}: {e}")
             # Fallback to mock price if offline
             mock_prices = {"BTC": 60000, "ETH": 3000, "SOL": 150}
             return {"success": True, "price": mock_prices.get(symbol.upper(), 100.0), "mock": True}
 
+    def _do_buy(self, balances, positions, symbol, amount, price, total):
+        usd = balances.get("USD", 0)
+        if usd < total: return {"success": False, "error": "Insufficient funds"}
+        balances["USD"] = usd - total
+        balances[symbol] = balances.get(symbol, 0) + amount
+        
+        # Position tracking
+        pos = positions.get(symbol, {"amount": 0, "avg_price": 0})
+        new_amount = pos["amount"] + amount
+        pos["avg_price"] = (pos["avg_price"] * pos["amount"] + price * amount) / new_amount
+        pos["amount"] = new_amount
+        positions[symbol] = pos
+
+    def _do_sell(self, balances, positions, symbol, amount, price, total):
+        bal = balances.get(symbol, 0)
+        if bal < amount: return {"success": False, "error": "Insufficient assets"}
+        balances["USD"] = balances.get("USD", 0) + total
+        balances[symbol] = bal - amount
+        
+        # Update position
+        pos = positions.get(symbol)
+        if pos is not None:
+            pos["amount"] -= amount
+            if pos["amount"] <= 0:
+                del positions[symbol]
+
+    def _backfill_ledger(self, state) -> bool:
+        """Copy history from before vault_ledger existed into the ledger, oldest first, once.
+
+        Returns True when every entry is ledgered and the history may be trimmed. Progress is
+        kept in state, so a failed write resumes where it stopped instead of duplicating entries.
+        """
+        history = state.get("transactions", [])
+        copied = state.get("ledger_backfill_count", 0)
+        for tx in reversed(history[:len(history) - copied]):
+            if not self.state_manager.append_domain("vault_ledger", tx):
+                state["ledger_backfill_count"] = copied
+                return False
+            copied += 1
+        state.pop("ledger_backfill_count", None)
+        state["ledger_backfilled"] = True
+        return True
+
+    # trade type -> handler; each returns an error dict or None on success
+    _TRADE_DISPATCH = {"buy": _do_buy, "sell": _do_sell}
+
     def execute_trade(self, symbol, amount, trade_type):
+        apply_trade = self._TRADE_DISPATCH.get(trade_type)
+        if apply_trade is None:
+            return {"success": False, "error": f"Invalid trade type: {trade_type}"}
+
         state = self.get_state()
         symbol = symbol.upper()
         
@@ -91,35 +266,16 @@ class KrakenBridge(BaseBridge):
         price = price_data["price"]
         total = amount * price
 
-        if trade_type == "buy":
-            usd = state.get("balances", {}).get("USD", 0)
-            if usd < total: return {"success": False, "error": "Insufficient funds"}
-            state["balances"]["USD"] = usd - total
-            state["balances"][symbol] = state["balances"].get(symbol, 0) + amount
-            
-            # Position tracking
-            pos = state.get("positions", {}).get(symbol, {"amount": 0, "avg_price": 0})
-            new_amount = pos["amount"] + amount
-            pos["avg_price"] = (pos["avg_price"] * pos["amount"] + price * amount) / new_amount
-            pos["amount"] = new_amount
-            state.setdefault("positions", {})[symbol] = pos
-
-        elif trade_type == "sell":
-            bal = state.get("balances", {}).get(symbol, 0)
-            if bal < amount: return {"success": False, "error": "Insufficient assets"}
-            state["balances"]["USD"] = state["balances"].get("USD", 0) + total
-            state["balances"][symbol] = bal - amount
-            
-            # Update position
-            if symbol in state.get("positions", {}):
-                state["positions"][symbol]["amount"] -= amount
-                if state["positions"][symbol]["amount"] <= 0:
-                    del state["positions"][symbol]
+        error = apply_trade(self, state.setdefault("balances", {}), state.setdefault("positions", {}),
+                            symbol, amount, price, total)
+        if error: return error
 
-        # Log Transaction
+        # Log Transaction (one clock read; millisecond ids avoid same-second collisions)
+        now = time.time()
+        iso = datetime.fromtimestamp(now).isoformat()
         tx = {
-            "id": f"tx_{int(time.time())}", 
-            "timestamp": datetime.now().isoformat(), 
+            "id": f"tx_{int(now * 1000)}", 
+            "timestamp": iso, 
             "symbol": symbol, 
             "amount": amount, 
             "price": price, 
@@ -127,8 +283,18 @@ class KrakenBridge(BaseBridge):
             "type": trade_type,
             "mode": "paper" if self.paper else "live"
         }
-        state.setdefault("transactions", []).insert(0, tx)
-        self.save_state(state)
+        # Newest first; built from the state just loaded so external edits are kept
+        state["transactions"] = [tx] + state.get("transactions", [])
+        if state.get("ledger_backfilled"):
+            if not self.state_manager.append_domain("vault_ledger", tx):
+                # The trade stands and stays in vault_state's recent history; only the full ledger misses it
+                logger.error("Ledger append failed for %s", tx["id"])
+        elif not self._backfill_ledger(state):
+            logger.error("Ledger backfill incomplete; keeping the full transaction history")
+        if state.get("ledger_backfilled"):
+            # Everything past the limit is already in vault_ledger
+            state["transactions"] = state["transactions"][:TX_HISTORY_LIMIT]
+        self.save_state(state, iso)
         
         return {"success": True, "transaction": tx}
 
@@ -181,6 +347,30 @@ class VaultPlugin:
     def on_event(self, event):
         if event.get("event") == "TICK_HOURLY":
             logger.info("Economy Pulse: Syncing balances...")
+            if isinstance(self.bridge, KrakenBridge):
+                # Network fetch off the event loop thread
+                threading.Thread(target=self._sync_prices, daemon=True).start()
+
+    def _sync_prices(self):
+        """Value all held positions with a single batched ticker request and store the total."""
+        positions = self.bridge.get_state().get("positions", {})
+        if not positions: return
+        try:
+            prices = self.bridge.get_prices(list(positions))
+        except Exception as e:
+            logger.error("Price sync error: %s", e)
+            return
+        value = sum(pos["amount"] * prices[symbol] for symbol, pos in positions.items() if symbol in prices)
+        # positions_value covers priced symbols only; the rest are listed so the total is not read as complete
+        unpriced = sorted(set(positions) - prices.keys())
+        if unpriced:
+            logger.warning("No price for %s; positions_value excludes them", ", ".join(unpriced))
+        # Merging update touches only these keys, so a trade saved meanwhile is kept
+        self.kernel.state_manager.update_domain("vault_state", {
+            "positions_value": round(value, 2),
+            "unpriced": unpriced,
+            "last_sync": datetime.now().isoformat()
+        })
 
     def handle_status(self):
         return self.bridge.get_status()
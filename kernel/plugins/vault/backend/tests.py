@@ -5,6 +5,8 @@ Vault Plugin Unit Test - Basic Trade Execution (Paper Mode)
 
 import sys
 import os
+import time
+from unittest.mock import patch
 
 # Add project root to path (parent of kernel/)
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
@@ -24,6 +26,8 @@ class MockStateManager:
             },
             "transactions": []
         }
+        self._ledger = []
+        self.append_budget = None # Appends allowed before append_domain starts failing; None = unlimited
 
     def get_domain(self, domain):
         if domain == "vault_state":
@@ -34,6 +38,15 @@ class MockStateManager:
         if domain == "vault_state":
             self._vault_state = data
 
+    def append_domain(self, domain, entry):
+        if self.append_budget is not None:
+            if self.append_budget == 0:
+                return False
+            self.append_budget -= 1
+        if domain == "vault_ledger":
+            self._ledger.append(entry)
+        return True
+
 
 class MockKernel:
     """Mock kernel with state_manager."""
@@ -76,6 +89,61 @@ def main():
     assert new_usd < initial_usd, f"USD balance should decrease: {initial_usd} -> {new_usd}"
     assert new_btc > initial_btc, f"BTC balance should increase: {initial_btc} -> {new_btc}"
     assert new_tx_count > initial_tx_count, "Transaction should be added to history"
+    assert mock_kernel.state_manager._ledger == transactions[:1], "Transaction should be appended to the ledger"
+
+    # An external reset of the history must survive the next trade
+    mock_kernel.state_manager._vault_state["transactions"] = []
+    plugin.handle_trade({"symbol": "BTC", "amount": 0.001, "type": "buy"})
+    history = mock_kernel.state_manager._vault_state["transactions"]
+    assert len(history) == 1, f"Trade should build on the stored history: {len(history)} entries"
+
+    # History from before the ledger existed is ledgered once, oldest first, before it is trimmed
+    sm = MockKernel().state_manager
+    bridge = KrakenBridge(sm, paper=True)
+    sm._vault_state["balances"]["USD"] = 1000000.0
+    sm._vault_state["transactions"] = [{"id": f"old_{i}"} for i in range(249, -1, -1)]
+    sm.append_budget = 100
+    bridge.execute_trade("BTC", 0.001, "buy")
+    assert len(sm._vault_state["transactions"]) == 251, "History must stay untrimmed while the backfill is incomplete"
+    assert not sm._vault_state.get("ledger_backfilled")
+    sm.append_budget = None
+    bridge.execute_trade("BTC", 0.001, "buy")
+    ids = [tx["id"] for tx in sm._ledger]
+    assert ids[:250] == [f"old_{i}" for i in range(250)], "Backfill should ledger old history oldest first"
+    assert len(ids) == 252 and len(set(ids)) == 252, f"Resumed backfill must not duplicate entries: {len(ids)}"
+    assert sm._vault_state["ledger_backfilled"] and "ledger_backfill_count" not in sm._vault_state
+    assert len(sm._vault_state["transactions"]) == 200, "History should be trimmed once ledgered"
+
+    # Batched sync maps canonical reply keys back to symbols and reports unlisted ones as unpriced
+    KrakenBridge._pair_names = {}
+    KrakenBridge._price_cache = {}
+    requested = []
+    replies = {
+        "/0/public/AssetPairs": {"XXBTZUSD": {"altname": "XBTUSD"}, "XLTCZUSD": {"altname": "LTCUSD"}},
+        "/0/public/Ticker": {"XXBTZUSD": {"c": ["60000.0", "1"]}, "XLTCZUSD": {"c": ["80.0", "1"]}},
+    }
+    def fake_get_json(path, **kwargs):
+        requested.append(path)
+        return {"error": [], "result": replies[path.split("?")[0]]}
+    plugin.bridge.get_json = fake_get_json
+    mock_kernel.state_manager._vault_state["positions"] = {
+        "BTC": {"amount": 0.5}, "LTC": {"amount": 10}, "FOO": {"amount": 3}
+    }
+    plugin._sync_prices()
+    synced = mock_kernel.state_manager._vault_state
+    assert requested[-1] == "/0/public/Ticker?pair=XXBTZUSD,XLTCZUSD", f"Unexpected ticker request: {requested}"
+    assert synced["positions_value"] == 30800.0, f"LTC should be priced via its canonical key: {synced}"
+    assert synced["unpriced"] == ["FOO"], f"Unknown symbols should be reported: {synced}"
+
+    # With the rate-limit bucket empty, a request-path price lookup falls back instead of sleeping
+    KrakenBridge._price_cache = {}
+    KrakenBridge._bucket.update(tokens=-10.0, ts=time.monotonic())
+    bridge = KrakenBridge(mock_kernel.state_manager, paper=True)
+    with patch("kernel.plugins.vault.backend.main.time.sleep") as sleep, \
+         patch("kernel.plugins.vault.backend.main.http_request") as http:
+        quote = bridge.get_price("BTC")
+    assert quote.get("mock") and not sleep.called and not http.called, f"Request path should fail fast: {quote}"
+    KrakenBridge._bucket.update(tokens=15.0, ts=time.monotonic())
 
     # Print result
     print(f"[VAULT TEST] Initial USD: {initial_usd}, New USD: {new_usd}")
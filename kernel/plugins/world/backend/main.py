@@ -3,17 +3,32 @@ World Engine Plugin - Atmospheric & Environmental Simulation (v7.0 Stable)
 Refactored for 1:1 Legacy Compliance & v7.0 Architecture (Zero Direct I/O)
 """
 
-import json
+import time
 import random
 import logging
 import asyncio
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='[WORLD] %(message)s')
 logger = logging.getLogger("world")
 
+MIN_SYNC_INTERVAL = 60 # Seconds; a re-fired TICK_HOURLY inside this window is ignored
+
+# Seed for a missing world_state; flat, so a dict() copy never aliases it
+DEFAULT_WORLD_STATE = {
+    "season": "spring",
+    "weather": "sunny",
+    "temperature": 18,
+    "lighting": "daylight",
+    "last_update": None
+}
+
+# Indexed by month - 1
+SEASON_BY_MONTH = ("winter", "winter", "spring", "spring", "spring", "summer",
+                   "summer", "summer", "autumn", "autumn", "autumn", "winter")
+
 # =============================================================================
 # WORLD LOGIC (Refactored for State Manager)
 # =============================================================================
@@ -21,31 +36,36 @@ logger = logging.getLogger("world")
 class WorldPlugin:
     def __init__(self):
         self.kernel = None
+        self._loop = None
+        self._last_sync = None # time.monotonic() of the last real-world sync
+        # event type -> handler; TICK_MINUTELY has no work yet, so it falls through the lookup
+        self._handlers = {"TICK_HOURLY": self._on_tick_hourly}
 
     def initialize(self, kernel):
         self.kernel = kernel
+        self._loop = getattr(kernel, "event_loop", None)
         # Ensure initial state for world exists
         if not self.kernel.state_manager.get_domain("world_state"):
-            self.kernel.state_manager.update_domain("world_state", {
-                "season": "spring",
-                "weather": "sunny",
-                "temperature": 18,
-                "lighting": "daylight",
-                "last_update": datetime.now().isoformat()
-            })
+            self.kernel.state_manager.update_domain(
+                "world_state", dict(DEFAULT_WORLD_STATE, last_update=datetime.now().isoformat()))
         logger.info("World Engine initialized (v7.0)")
 
     def on_event(self, event):
-        if event.get("event") == "TICK_HOURLY":
-            self._sync_with_real_world()
+        handler = self._handlers.get(event.get("event"))
+        if handler:
+            handler()
+
+    def _on_tick_hourly(self):
+        t = time.monotonic()
+        if self._last_sync is not None and t - self._last_sync < MIN_SYNC_INTERVAL:
+            return
+        self._last_sync = t
+        self._sync_with_real_world()
 
     def _sync_with_real_world(self):
         """1:1 Legacy Port of syncWorldWithRealWorld."""
-        month = datetime.now().month
-        if 3 <= month <= 5: season = "spring"
-        elif 6 <= month <= 8: season = "summer"
-        elif 9 <= month <= 11: season = "autumn"
-        else: season = "winter"
+        now = datetime.now() # One clock read for the whole sync
+        season = SEASON_BY_MONTH[now.month - 1]
 
         # Estimated Weather
         rand = random.random()
@@ -59,7 +79,7 @@ class WorldPlugin:
             weather, temp = ("sunny", 18)
 
         # Lighting based on hour
-        hour = datetime.now().hour
+        hour = now.hour
         if 6 <= hour < 18: lighting = "daylight"
         elif 18 <= hour < 22: lighting = "sunset"
         elif 22 <= hour or hour < 6: lighting = "night"
@@ -70,18 +90,18 @@ class WorldPlugin:
             "weather": weather,
             "temperature": temp,
             "lighting": lighting,
-            "last_update": datetime.now().isoformat()
+            "last_update": now.isoformat()
         }
         
         self.kernel.state_manager.update_domain("world_state", new_state)
-        logger.info(f"World sync: {season}, {weather}, {temp}°C, {lighting}")
+        logger.info("World sync: %s, %s, %s°C, %s", season, weather, temp, lighting)
         self._fire_event("EVENT_WEATHER_UPDATE", new_state)
 
     def _fire_event(self, event_type, data):
-        if self.kernel and self.kernel.event_bus:
+        if self._loop and self.kernel.event_bus:
             asyncio.run_coroutine_threadsafe(
                 self.kernel.event_bus.publish(event_type, "plugin.world", data),
-                self.kernel.event_loop
+                self._loop
             )
 
     # -------------------------------------------------------------------------
@@ -3,17 +3,19 @@
 World Plugin Unit Tests - Weather Sync & Lighting Logic
 
 Tests the world engine to ensure:
-- Weather simulation generates valid data
-- Lighting calculations work correctly
-- State persistence functions
+- Real-world sync derives season, weather and lighting correctly
+- Tick events trigger (and throttle) syncs
+- State persistence and API handlers function
 
 Uses mocked kernel and state_manager.
 """
 
 import sys
 import os
+import copy
 import importlib.util
-from unittest.mock import MagicMock, patch
+from collections import Counter
+from unittest.mock import patch
 from datetime import datetime
 
 # Calculate paths
@@ -23,311 +25,250 @@ MAIN_PATH = os.path.join(TESTS_DIR, "main.py")
 # Add tests directory to path for imports
 sys.path.insert(0, TESTS_DIR)
 
+# Read the clock once; tests only check that last_update is present
+_FROZEN_NOW = datetime.now().isoformat()
+
+# Pristine mock state; every fresh state manager and per-test reset deep-copies it
+DEFAULT_STATE = {
+    "world_state": {
+        "season": "winter",
+        "weather": "cloudy",
+        "temperature": 2,
+        "lighting": "night",
+        "last_update": _FROZEN_NOW
+    }
+}
+
+# Fields every world_state snapshot must carry
+_STATE_KEYS = frozenset({"season", "weather", "temperature", "lighting", "last_update"})
+
+_VALID_SEASONS = frozenset({"winter", "spring", "summer", "autumn"})
+_VALID_WEATHER = frozenset({"sunny", "cloudy", "snowy", "rainy", "stormy"})
+_VALID_LIGHTING = frozenset({"daylight", "sunset", "night"})
+
 
 class MockStateManager:
     def __init__(self):
-        self._data = {
-            "world_state": {
-                "initialized": True,
-                "location": {
-                    "city": "Berlin",
-                    "latitude": 52.52,
-                    "longitude": 13.405,
-                    "timezone": "Europe/Berlin"
-                },
-                "weather": {
-                    "temperature": 18.0,
-                    "condition": "clear",
-                    "humidity": 65,
-                    "wind_speed": 12.0,
-                    "last_updated": datetime.now().isoformat()
-                },
-                "lighting": {
-                    "sunrise": "06:45",
-                    "sunset": "18:30",
-                    "is_daytime": True
-                },
-                "atmosphere": {
-                    "fog_density": 0.0,
-                    "cloud_cover": 20,
-                    "precipitation_chance": 10,
-                    "air_quality_index": 35
-                },
-                "season": "winter"
-            }
-        }
+        self._data = copy.deepcopy(DEFAULT_STATE)
 
     def get_domain(self, domain):
-        return self._data.get(domain)
+        return self._data.get(domain, {})
 
     def update_domain(self, domain, data):
         self._data[domain] = data
 
 
+class _NoopBus:
+    """Event bus stand-in; the tests never inspect published events."""
+    __slots__ = ()
+
+    def __getattr__(self, _name):
+        return lambda *args, **kwargs: None
+
+
 class MockKernel:
     def __init__(self):
         self.state_manager = MockStateManager()
-        self.model_config = {}
-        self.event_bus = MagicMock()
+        self.event_bus = _NoopBus()
+        self.event_loop = None # No running loop, so the plugin skips publishing
 
 
 # Create mock kernel
 mock_kernel = MockKernel()
 
-# Load the plugin module directly
-spec = importlib.util.spec_from_file_location("world_main", MAIN_PATH)
-world_main = importlib.util.module_from_spec(spec)
-sys.modules["world_main"] = world_main
-spec.loader.exec_module(world_main)
-
-
-# =============================================================================
-# TESTS
-# =============================================================================
-
-def test_weather_simulator_generates_valid_data():
-    """Test that weather simulator generates valid weather data."""
-    from world_main import WorldState, WeatherSimulator, WorldPlugin
-
-    state = WorldState(mock_kernel.state_manager)
-    sim = WeatherSimulator(state, {})
-
-    weather = sim.simulate_weather()
-
-    # Verify required fields exist
-    assert "temperature" in weather
-    assert "condition" in weather
-    assert "humidity" in weather
-    assert "wind_speed" in weather
-    assert "pressure" in weather
-    assert "visibility" in weather
-    assert "uv_index" in weather
-    assert "feels_like" in weather
 
-    # Verify value ranges
-    assert -20 <= weather["temperature"] <= 50, f"Temperature out of range: {weather['temperature']}"
-    assert 0 <= weather["humidity"] <= 100, f"Humidity out of range: {weather['humidity']}"
-    assert weather["condition"] in WeatherSimulator.CONDITIONS, f"Invalid condition: {weather['condition']}"
+def reset_mock_kernel():
+    """Reset the shared mock kernel state for fresh tests."""
+    mock_kernel.state_manager._data = copy.deepcopy(DEFAULT_STATE)
 
-    # Update world_state to verify persistence
-    mock_kernel.state_manager.update_domain("world_state", state.get())
 
-    print("[PASS] Weather simulator generates valid data")
+# Import main.py once as world_main; the patch("world_main....") targets below rely on that name
+if "world_main" in sys.modules:
+    world_main = sys.modules["world_main"]
+else:
+    spec = importlib.util.spec_from_file_location("world_main", MAIN_PATH)
+    world_main = importlib.util.module_from_spec(spec)
+    sys.modules["world_main"] = world_main
+    spec.loader.exec_module(world_main)
 
+WorldPlugin = world_main.WorldPlugin
 
-def test_weather_condition_transition():
-    """Test that weather conditions transition realistically."""
-    from world_main import WorldState, WeatherSimulator
 
-    state = WorldState(mock_kernel.state_manager)
-    sim = WeatherSimulator(state, {})
+def frozen_datetime(*args):
+    """datetime subclass whose now() always returns datetime(*args)."""
+    moment = datetime(*args)
 
-    # Start with clear weather
-    state._state["weather"]["condition"] = "clear"
+    class _Frozen(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return moment
 
-    # Simulate multiple times
-    conditions = set()
-    for _ in range(10):
-        weather = sim.simulate_weather()
-        conditions.add(weather["condition"])
+    return _Frozen
 
-    # Should have valid conditions
-    for c in conditions:
-        assert c in WeatherSimulator.CONDITIONS
 
-    # Verify world_state was updated
-    current_state = mock_kernel.state_manager.get_domain("world_state")
-    assert current_state is not None
-
-    print("[PASS] Weather condition transitions work")
-
-
-def test_lighting_engine_calculates_sun_times():
-    """Test that lighting engine calculates sunrise/sunset correctly."""
-    from world_main import WorldState, LightingEngine
+def make_plugin():
+    """WorldPlugin initialized against the shared mock kernel."""
+    plugin = WorldPlugin()
+    plugin.initialize(mock_kernel)
+    return plugin
 
-    state = WorldState(mock_kernel.state_manager)
-    engine = LightingEngine(state)
 
-    lighting = engine.calculate_lighting()
+# =============================================================================
+# TESTS
+# =============================================================================
 
-    # Verify required fields
-    assert "sunrise" in lighting
-    assert "sunset" in lighting
-    assert "is_daytime" in lighting
-    assert "moon_phase" in lighting
-    assert "golden_hour_morning" in lighting
-    assert "golden_hour_evening" in lighting
-    assert "moon_illumination" in lighting
+def test_world_plugin_initialization():
+    """Test that WorldPlugin seeds world_state when none exists."""
+    test_kernel = MockKernel()
+    test_kernel.state_manager._data = {}
 
-    # Verify time format (HH:MM)
-    assert ":" in lighting["sunrise"]
-    assert ":" in lighting["sunset"]
+    plugin = WorldPlugin()
+    plugin.initialize(test_kernel)
 
-    # Update lighting in world_state
-    state.update_lighting(lighting)
-    updated_state = mock_kernel.state_manager.get_domain("world_state")
-    assert updated_state["lighting"]["sunrise"] == lighting["sunrise"]
+    persisted = test_kernel.state_manager.get_domain("world_state")
+    missing = _STATE_KEYS - persisted.keys()
+    assert not missing, f"Missing world_state fields: {sorted(missing)}"
+    assert persisted["last_update"] is not None, "Seed should be timestamped"
+    assert persisted is not world_main.DEFAULT_WORLD_STATE, "Seed must not alias the module default"
 
-    print("[PASS] Lighting engine calculates sun times")
+    print("[PASS] WorldPlugin seeds world_state")
 
 
-def test_lighting_moon_phase_calculation():
-    """Test moon phase calculation."""
-    from world_main import WorldState, LightingEngine
+def test_world_plugin_keeps_existing_state():
+    """Test that initialize leaves an existing world_state untouched."""
+    make_plugin()
 
-    state = WorldState(mock_kernel.state_manager)
-    engine = LightingEngine(state)
+    persisted = mock_kernel.state_manager.get_domain("world_state")
+    assert persisted == DEFAULT_STATE["world_state"], f"Existing state was overwritten: {persisted}"
 
-    now = datetime.now()
-    phase, illumination = engine._calculate_moon(now)
+    print("[PASS] WorldPlugin keeps existing world_state")
 
-    valid_phases = ["new_moon", "waxing_crescent", "first_quarter", "waxing_gibbous",
-                    "full_moon", "waning_gibbous", "last_quarter", "waning_crescent"]
 
-    assert phase in valid_phases, f"Invalid moon phase: {phase}"
-    assert 0 <= illumination <= 100, f"Illumination out of range: {illumination}"
+def test_sync_generates_valid_state():
+    """Test that a real-world sync persists a complete, valid world_state."""
+    plugin = make_plugin()
 
-    # Verify moon data is stored in world_state
-    state._state["lighting"]["moon_phase"] = phase
-    state._state["lighting"]["moon_illumination"] = illumination
-    state._save_to_manager()
-    current = mock_kernel.state_manager.get_domain("world_state")
-    assert current["lighting"]["moon_phase"] == phase
+    plugin._sync_with_real_world()
 
-    print("[PASS] Moon phase calculation works")
+    state = mock_kernel.state_manager.get_domain("world_state")
+    missing = _STATE_KEYS - state.keys()
+    assert not missing, f"Missing world_state fields: {sorted(missing)}"
+    assert state["season"] in _VALID_SEASONS, f"Invalid season: {state['season']}"
+    assert state["weather"] in _VALID_WEATHER, f"Invalid weather: {state['weather']}"
+    assert state["lighting"] in _VALID_LIGHTING, f"Invalid lighting: {state['lighting']}"
+    assert -20 <= state["temperature"] <= 50, f"Temperature out of range: {state['temperature']}"
 
+    print("[PASS] World sync generates valid state")
 
-def test_world_state_updates():
-    """Test that WorldState properly updates weather data."""
-    from world_main import WorldState
 
-    state = WorldState(mock_kernel.state_manager)
+def test_season_weather_by_roll():
+    """Test each season's weather and temperature for high and low rolls."""
+    plugin = make_plugin()
 
-    # Update weather
-    new_weather = {
-        "temperature": 25.0,
-        "condition": "clear"
+    # (month, roll) -> (season, weather, temperature)
+    cases = {
+        (7, 0.9): ("summer", "sunny", 34),
+        (7, 0.1): ("summer", "cloudy", 20),
+        (1, 0.9): ("winter", "snowy", -6),
+        (1, 0.1): ("winter", "cloudy", 2),
+        (10, 0.9): ("autumn", "rainy", 10),
+        (10, 0.1): ("autumn", "stormy", 8),
+        (4, 0.9): ("spring", "sunny", 18),
+        (4, 0.1): ("spring", "sunny", 18),
     }
-    state.update_weather(new_weather)
+    for (month, roll), expected in cases.items():
+        with patch.object(world_main, "datetime", frozen_datetime(2026, month, 15, 12)), \
+             patch("world_main.random.random", return_value=roll):
+            plugin._sync_with_real_world()
+        state = mock_kernel.state_manager.get_domain("world_state")
+        got = (state["season"], state["weather"], state["temperature"])
+        assert got == expected, f"Month {month}, roll {roll}: expected {expected}, got {got}"
 
-    # Verify update in state object
-    current = state.get()
-    assert current["weather"]["temperature"] == 25.0
-    assert current["weather"]["condition"] == "clear"
-    assert "last_updated" in current["weather"]
+    print("[PASS] Season weather follows the roll")
 
-    # Verify persistence in state_manager (world_state updated correctly)
-    persisted = mock_kernel.state_manager.get_domain("world_state")
-    assert persisted["weather"]["temperature"] == 25.0
-    assert persisted["weather"]["condition"] == "clear"
 
-    print("[PASS] World state updates work correctly")
+def test_lighting_by_hour():
+    """Test lighting phase boundaries across the day."""
+    plugin = make_plugin()
 
+    for hour, expected in ((5, "night"), (6, "daylight"), (17, "daylight"),
+                           (18, "sunset"), (21, "sunset"), (22, "night")):
+        with patch.object(world_main, "datetime", frozen_datetime(2026, 4, 15, hour)):
+            plugin._sync_with_real_world()
+        lighting = mock_kernel.state_manager.get_domain("world_state")["lighting"]
+        assert lighting == expected, f"Hour {hour}: expected {expected}, got {lighting}"
 
-def test_world_plugin_initialization():
-    """Test that WorldPlugin initializes correctly with kernel."""
-    from world_main import WorldPlugin
+    print("[PASS] Lighting follows the hour")
 
-    # Create fresh mock kernel with complete state
-    test_kernel = MockKernel()
-
-    plugin = WorldPlugin()
-
-    # Initialize with mock kernel directly
-    plugin.initialize(test_kernel)
 
-    # Verify plugin is initialized
-    assert plugin.world_state is not None, "WorldState not initialized"
-    assert plugin.weather_sim is not None, "WeatherSimulator not initialized"
-    assert plugin.lighting_engine is not None, "LightingEngine not initialized"
-    assert plugin.atmosphere_engine is not None, "AtmosphereEngine not initialized"
+def test_season_detection():
+    """Test the month -> season table covers every month with a valid season."""
+    seasons = world_main.SEASON_BY_MONTH
 
-    # Verify world_state was persisted to state_manager
-    persisted = test_kernel.state_manager.get_domain("world_state")
-    assert persisted is not None, "world_state not persisted"
-    assert "weather" in persisted, "weather not in world_state"
-    assert "lighting" in persisted, "lighting not in world_state"
+    assert len(seasons) == 12, f"Expected 12 months, got {len(seasons)}"
+    invalid = set(seasons) - _VALID_SEASONS
+    assert not invalid, f"Invalid seasons: {sorted(invalid)}"
+    assert seasons[0] == "winter" and seasons[6] == "summer", f"Unexpected mapping: {seasons}"
 
-    print("[PASS] WorldPlugin initializes correctly")
+    print("[PASS] Season detection works")
 
 
 def test_world_plugin_tick_event():
-    """Test that WorldPlugin responds to tick events."""
-    from world_main import WorldPlugin, initialize
+    """Test that TICK_HOURLY syncs and a re-fired tick inside the window is ignored."""
+    plugin = make_plugin()
 
-    # Create fresh mock kernel
-    test_kernel = MockKernel()
-    plugin = WorldPlugin()
-    plugin.initialize(test_kernel)
-
-    # Get initial state
-    initial_weather = plugin.world_state.get()["weather"]
+    plugin.on_event({"event": "TICK_HOURLY"})
+    synced = mock_kernel.state_manager.get_domain("world_state")
+    assert synced["last_update"] != _FROZEN_NOW, "Tick should refresh world_state"
 
-    # Fire TICK_HOURLY event
-    event = {"event": "TICK_HOURLY"}
-    plugin.on_event(event)
+    # A second tick within MIN_SYNC_INTERVAL must not overwrite the state
+    marker = dict(synced, weather="marker")
+    mock_kernel.state_manager.update_domain("world_state", marker)
+    plugin.on_event({"event": "TICK_HOURLY"})
+    assert mock_kernel.state_manager.get_domain("world_state") is marker, "Re-fired tick should be throttled"
 
-    # Verify state was updated
-    updated_weather = plugin.world_state.get()["weather"]
-
-    # Weather should have been updated (may be same or different due to simulation)
-    assert "temperature" in updated_weather
-    assert "condition" in updated_weather
-
-    # Verify state persisted to state_manager
-    persisted = test_kernel.state_manager.get_domain("world_state")
-    assert persisted["weather"]["last_updated"] is not None
+    # Unhandled events are ignored
+    plugin.on_event({"event": "TICK_MINUTELY"})
+    assert mock_kernel.state_manager.get_domain("world_state") is marker
 
     print("[PASS] WorldPlugin handles tick events correctly")
 
 
-def test_season_detection():
-    """Test season detection based on current month."""
-    from world_main import WeatherSimulator
-
-    # Create a mock state
-    mock_state = MagicMock()
-    mock_state.get.return_value = {"weather": {"temperature": 15.0}}
-
-    sim = WeatherSimulator(mock_state, {})
-
-    # Test get_current_season returns valid season
-    season = sim.get_current_season()
-    valid_seasons = ["winter", "spring", "summer", "autumn"]
-    assert season in valid_seasons, f"Invalid season: {season}"
-
-    print("[PASS] Season detection works")
-
-
-def test_atmosphere_engine():
-    """Test atmosphere calculation based on weather."""
-    from world_main import WorldState, AtmosphereEngine
+def test_api_handlers():
+    """Test the weather, lighting and location API handlers."""
+    plugin = make_plugin()
 
-    state = WorldState(mock_kernel.state_manager)
-    engine = AtmosphereEngine(state)
+    assert plugin.handle_get_state() == DEFAULT_STATE["world_state"]
+    assert plugin.handle_get_weather() == {"weather": "cloudy", "temp": 2}
+    assert plugin.handle_get_lighting() == {"lighting": "night"}
 
-    # Set rainy weather
-    state._state["weather"]["condition"] = "rain"
+    result = plugin.handle_set_location({"location": "office"})
+    assert result == {"success": True, "location": "office"}, f"Unexpected result: {result}"
+    physique = mock_kernel.state_manager.get_domain("physique")
+    assert physique["current_location"] == "office", f"Location not persisted: {physique}"
 
-    atmosphere = engine.calculate_atmosphere()
-
-    # Verify required fields
-    assert "fog_density" in atmosphere
-    assert "cloud_cover" in atmosphere
-    assert "precipitation_chance" in atmosphere
-    assert "air_quality_index" in atmosphere
-
-    # Rain should have high precipitation chance
-    assert atmosphere["precipitation_chance"] >= 70
-
-    print("[PASS] Atmosphere engine works")
+    print("[PASS] API handlers work")
 
 
 # =============================================================================
 # MAIN
 # =============================================================================
 
+def _run(test):
+    """Run one test against fresh mock state; return "pass", "fail" or "error"."""
+    print(f"\n>>> Running: {test.__name__}")
+    reset_mock_kernel()
+    try:
+        test()
+        return "pass"
+    except AssertionError as e:
+        print(f"[FAIL] {test.__name__}: {e}")
+        return "fail"
+    except Exception as e:
+        print(f"[ERROR] {test.__name__}: {e}")
+        return "error"
+
+
 def main():
     """Run all World plugin tests."""
     print("=" * 60)
@@ -335,31 +276,19 @@ def main():
     print("=" * 60)
 
     tests = [
-        test_weather_simulator_generates_valid_data,
-        test_weather_condition_transition,
-        test_lighting_engine_calculates_sun_times,
-        test_lighting_moon_phase_calculation,
-        test_world_state_updates,
-        test_season_detection,
-        test_atmosphere_engine,
         test_world_plugin_initialization,
+        test_world_plugin_keeps_existing_state,
+        test_sync_generates_valid_state,
+        test_season_weather_by_roll,
+        test_lighting_by_hour,
+        test_season_detection,
         test_world_plugin_tick_event,
+        test_api_handlers,
     ]
 
-    passed = 0
-    failed = 0
-
-    for test in tests:
-        try:
-            print(f"\n>>> Running: {test.__name__}")
-            test()
-            passed += 1
-        except AssertionError as e:
-            print(f"[FAIL] {test.__name__}: {e}")
-            failed += 1
-        except Exception as e:
-            print(f"[ERROR] {test.__name__}: {e}")
-            failed += 1
+    results = Counter(_run(test) for test in tests)
+    passed = results["pass"]
+    failed = results["fail"] + results["error"]
 
     print("\n" + "=" * 60)
     print(f"RESULTS: {passed} passed, {failed} failed")